@@ -1,121 +1,310 @@
 import os
+import asyncio
+import contextlib
+import copy
+import hashlib
 from dotenv import load_dotenv
 import json
+import orjson
 import re
+import logging
+from collections import defaultdict
+from collections.abc import Callable
+from io import StringIO
+from time import perf_counter
 
 load_dotenv()  # loads .env into environment variables
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from llm_cache import LLMCache, SemanticCache, fingerprint, make_key
+
+# Basic logger for visibility in console/Streamlit logs
+logger = logging.getLogger("cmsautomatex.ai_service")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _formatter = logging.Formatter("%(asctime)s %(levelname)s [ai_service] %(message)s")
+    _handler.setFormatter(_formatter)
+    logger.addHandler(_handler)
+logger.setLevel(logging.INFO)
 
 # Azure OpenAI Configuration
 AZURE_OPENAI_KEY = os.getenv("AZURE_OPENAI_KEY")
 AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
 AZURE_OPENAI_DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
+# Optional: enables the semantic cache for ask_ai (e.g. a text-embedding-3-small deployment)
+AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME")
 
 if not AZURE_OPENAI_KEY or not AZURE_OPENAI_ENDPOINT or not AZURE_OPENAI_DEPLOYMENT_NAME:
     raise ValueError("Azure OpenAI credentials not found in .env. Required: AZURE_OPENAI_KEY, AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_DEPLOYMENT_NAME")
 
-client = OpenAI(
+# Cheaper/faster deployment for light tasks such as suggested questions (e.g. gpt-4.1-nano).
+# Falls back to the main deployment when not configured.
+AZURE_OPENAI_FAST_DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_FAST_DEPLOYMENT_NAME") or AZURE_OPENAI_DEPLOYMENT_NAME
+
+# Async client so independent LLM calls (and concurrent users) overlap on one event loop.
+# One process-wide HTTP/2 pool: concurrent completions multiplex over a warm TLS connection.
+aclient = AsyncOpenAI(
     base_url=AZURE_OPENAI_ENDPOINT,
-    api_key=AZURE_OPENAI_KEY
+    api_key=AZURE_OPENAI_KEY,
+    timeout=httpx.Timeout(60.0, connect=5.0),
+    # SDK retries timeouts, 429s and 5xx with exponential backoff + jitter
+    max_retries=3,
+    http_client=DefaultAsyncHttpxClient(
+        http2=True,
+        # httpx drops idle connections after 5s by default; RFP batches and chat turns
+        # are often further apart than that, so keep them warm for 5 minutes
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=300)
+    )
 )
 
+# Seconds to wait for the first streamed token before abandoning and retrying a
+# stalled request (separate from the connect/read timeouts above)
+FIRST_TOKEN_TIMEOUT = 30.0
+STREAM_ATTEMPTS = 3
+
 
-def _strip_code_fences(s: str) -> str:
-    # Remove Markdown code fences like ```json ... ```
-    s = re.sub(r"^\s*```(?:json)?", "", s, flags=re.IGNORECASE)
-    s = re.sub(r"```\s*$", "", s)
-    return s.strip()
+async def _read_until_first_choice(chunks) -> list:
+    head = []
+    async for chunk in chunks:
+        head.append(chunk)
+        # Azure may send chunks without choices (e.g. content filter results)
+        if chunk.choices:
+            break
+    return head
+
+
+async def _stream_completion(**kwargs):
+    """
+    Opens a streaming chat completion and yields its chunks.
+    If no token arrives within FIRST_TOKEN_TIMEOUT the stream is closed and the
+    request re-issued (up to STREAM_ATTEMPTS), so one queued/cold request cannot
+    stall the caller indefinitely.
+    """
+    for attempt in range(1, STREAM_ATTEMPTS + 1):
+        stream = await aclient.chat.completions.create(stream=True, **kwargs)
+        chunks = stream.__aiter__()
+        try:
+            head = await asyncio.wait_for(_read_until_first_choice(chunks), FIRST_TOKEN_TIMEOUT)
+        except asyncio.TimeoutError:
+            await stream.close()
+            if attempt == STREAM_ATTEMPTS:
+                raise
+            logger.warning("No token after %.0fs (attempt %d/%d); retrying", FIRST_TOKEN_TIMEOUT, attempt, STREAM_ATTEMPTS)
+            continue
+        for chunk in head:
+            yield chunk
+        async for chunk in chunks:
+            yield chunk
+        return
+
+
+# Max RFP batches in flight at once for a single analysis; raise it to match the
+# deployment's rate limit (e.g. 8 on a high-TPM deployment)
+RFP_BATCH_CONCURRENCY = max(1, int(os.getenv("RFP_BATCH_CONCURRENCY", "4")))
+# Website-content budget per RFP request (~4 chars/token, i.e. ~12k input tokens),
+# shared evenly between the batch's pages
+RFP_CONTEXT_CHAR_BUDGET = 48000
+# Rough (low, high) seconds per wave of concurrent RFP batches, for time estimates
+RFP_SECONDS_PER_WAVE = (15, 30)
+
+# Exact-match response cache shared by all entry points (1 hour TTL)
+llm_cache = LLMCache(ttl=3600)
+# Whole-analysis cache: context fingerprint -> final RFP dict (24 hour TTL)
+rfp_result_cache = LLMCache(ttl=86400, maxsize=64)
+# Semantic cache for ask_ai: near-duplicate questions about the same site reuse answers
+semantic_cache = SemanticCache(threshold=0.92, ttl=3600)
+
+
+async def _embed(text: str) -> list[float] | None:
+    """Embeds text for the semantic cache; returns None when disabled or on failure."""
+    if not AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME:
+        return None
+    try:
+        response = await aclient.embeddings.create(
+            model=AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME,
+            input=text
+        )
+        return response.data[0].embedding
+    except Exception as e:
+        logger.warning("Embedding failed, skipping semantic cache: %s", e)
+        return None
+
+
+async def chat_completion(messages: list[dict], *, model: str | None = None, json_mode: bool = False, timeout: float = 30.0, validate: Callable[[str], bool] | None = None, **kwargs) -> str:
+    """
+    Non-streaming chat completion behind the shared response cache.
+    Retries come from the client (max_retries); latency is logged per call.
+    Returns the message content ("" if the model sent none).
+    A reply is cached only if it is non-empty and passes `validate` (when given),
+    so an unusable reply is retried on the next call instead of replayed.
+    """
+    model = model or AZURE_OPENAI_DEPLOYMENT_NAME
+    if json_mode:
+        kwargs["response_format"] = {"type": "json_object"}
+    cache_key = make_key(model, messages, **kwargs)
+    cached = llm_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    t0 = perf_counter()
+    response = await aclient.chat.completions.create(
+        model=model,
+        messages=messages,
+        timeout=timeout,
+        **kwargs
+    )
+    content = (response.choices[0].message.content or "").strip()
+    logger.info("chat completion (%s) took %.2fs", model, perf_counter() - t0)
+    if content and (validate is None or validate(content)):
+        llm_cache.set(cache_key, content)
+    return content
+
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_URL_RE = re.compile(r'https?://[^\s)"\']+')
+
+
+def _compact_context(context: str, max_line_chars: int = 4000) -> str:
+    """
+    Shrinks website context before it is sent to the model:
+    collapses whitespace runs, drops lines repeated within the same [URL] section
+    and caps each line at max_line_chars.
+    [URL] markers are always kept (and start a fresh section) so batch filtering
+    still works and no page loses its text to an earlier page.
+    """
+    seen = set()
+    out = []
+    for line in context.split("\n"):
+        line = _WHITESPACE_RE.sub(" ", line).strip()
+        if not line:
+            continue
+        if line.startswith("[URL]"):
+            seen.clear()
+        elif line in seen:
+            continue
+        else:
+            seen.add(line)
+            line = line[:max_line_chars]
+        out.append(line)
+    return "\n".join(out)
 
 
-def _remove_trailing_commas(s: str) -> str:
-    # Remove trailing commas before closing braces/brackets
-    return re.sub(r",\s*([}\]])", r"\1", s)
+# Structural tokens for brace matching: a brace, or a whole string literal to skip over
+_JSON_STRUCT_RE = re.compile(r'[{}]|"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
 
 
 def _extract_balanced_json(s: str) -> str | None:
     # Extract the first balanced JSON object {...}
+    # Walks only structural tokens found by _sre, so braces inside strings are ignored
     start = s.find("{")
     if start == -1:
         return None
     depth = 0
-    for i in range(start, len(s)):
-        ch = s[i]
-        if ch == '{':
+    for m in _JSON_STRUCT_RE.finditer(s, start):
+        tok = m.group()
+        if tok == "{":
             depth += 1
-        elif ch == '}':
+        elif tok == "}":
             depth -= 1
             if depth == 0:
-                return s[start:i+1]
+                return s[start:m.end()]
     return None
 
 
-def _escape_newlines_in_strings(s: str) -> str:
-    # Replace raw CR/LF within JSON strings with \n to preserve validity
-    out = []
-    in_str = False
-    escape = False
-    for ch in s:
-        if in_str:
-            if escape:
-                out.append(ch)
-                escape = False
-                continue
-            if ch == "\\":
-                out.append(ch)
-                escape = True
-                continue
-            if ch == '"':
-                out.append(ch)
-                in_str = False
-                continue
-            if ch == "\n" or ch == "\r":
-                out.append("\\n")
-            else:
-                out.append(ch)
-        else:
-            if ch == '"':
-                out.append(ch)
-                in_str = True
-            else:
-                out.append(ch)
-    return "".join(out)
+# Tokens needed to rebalance truncated JSON: brackets, element separators, whole
+# strings (an unterminated final string runs to the end)
+_JSON_TRUNC_RE = re.compile(r'[{}\[\],]|"[^"\\]*(?:\\.[^"\\]*)*(?:"|\\?\Z)', re.DOTALL)
+
+
+def _close_truncated_json(s: str) -> str | None:
+    # Repair output cut off mid-stream (finish_reason == "length"): drop the partial
+    # element after the last structural comma and close whatever is still open
+    stack = []
+    cut = None
+    for m in _JSON_TRUNC_RE.finditer(s):
+        tok = m.group()
+        if tok == "{":
+            stack.append("}")
+        elif tok == "[":
+            stack.append("]")
+        elif tok in "}]":
+            if stack:
+                stack.pop()
+        elif tok == ",":
+            cut = (m.start(), tuple(stack))
+    if not stack:
+        return s
+    if cut is None:
+        return None
+    pos, closers = cut
+    return s[:pos] + "".join(reversed(closers))
+
+
+# One pass over the repair path: a leading/trailing Markdown fence, a JSON string
+# literal (escapes included; an unterminated one runs to the end) or a trailing comma
+# before a closing brace/bracket (the closer is captured)
+_JSON_SANITIZE_RE = re.compile(
+    r'\A\s*```(?:json)?|```\s*\Z|"[^"\\]*(?:\\.[^"\\]*)*(?:"|\\?\Z)|,\s*([}\]])',
+    re.DOTALL | re.IGNORECASE,
+)
+# Inside a literal: an escape pair (kept as-is) or a raw CR/LF (escaped)
+_STR_NEWLINE_RE = re.compile(r"(\\.)|[\r\n]", re.DOTALL)
+_NEWLINE_ESCAPES = str.maketrans({"\r": "\\n", "\n": "\\n"})
+
+
+def _sanitize_token(m: re.Match) -> str:
+    closer = m.group(1)
+    if closer:
+        # Trailing comma: keep only the closing brace/bracket
+        return closer
+    lit = m.group()
+    if lit[0] != '"':
+        # Code fence around the payload
+        return ""
+    if "\n" not in lit and "\r" not in lit:
+        return lit
+    if "\\" not in lit:
+        return lit.translate(_NEWLINE_ESCAPES)
+    return _STR_NEWLINE_RE.sub(lambda n: n.group(1) or "\\n", lit)
+
+
+def _sanitize_json(s: str) -> str:
+    # Strip code fences, escape raw CR/LF inside JSON strings and drop trailing commas
+    # in a single scan; commas and backticks inside string values are left alone
+    if "\n" not in s and "\r" not in s and "," not in s and "```" not in s:
+        return s.strip()
+    return _JSON_SANITIZE_RE.sub(_sanitize_token, s).strip()
 
 
 def _safe_json_loads(s: str) -> dict:
     # Attempt direct parse
     try:
-        return json.loads(s)
+        return orjson.loads(s)
     except json.JSONDecodeError:
         pass
 
     # Sanitize common issues then parse
-    s2 = _strip_code_fences(s)
-    s2 = _escape_newlines_in_strings(s2)
-    s2 = _remove_trailing_commas(s2)
+    s2 = _sanitize_json(s)
     try:
-        return json.loads(s2)
+        return orjson.loads(s2)
     except json.JSONDecodeError:
         pass
 
     # Extract balanced object if extra text surrounds JSON
+    # (s2 is already sanitized, so slices of it need no second pass)
     block = _extract_balanced_json(s2)
     if block:
-        block = _escape_newlines_in_strings(block)
-        block = _remove_trailing_commas(block)
-        return json.loads(block)
+        return orjson.loads(block)
 
-    # Last attempt: regex-based greedy object
-    match = re.search(r"\{[\s\S]*\}", s2)
-    if match:
-        block = _escape_newlines_in_strings(match.group())
-        block = _remove_trailing_commas(block)
-        return json.loads(block)
+    # Last attempt: outermost first '{' .. last '}' span (same as a greedy regex, without backtracking)
+    start, end = s2.find("{"), s2.rfind("}")
+    if start != -1 and end > start:
+        return orjson.loads(s2[start:end + 1])
 
     raise json.JSONDecodeError("Unable to parse JSON", s, 0)
 
 
-def ask_ai(user_question, website_context):
-    system_prompt = """
+_ASK_SYSTEM_PROMPT = """
 You are an expert UI/UX analyst and CMS architect.
 
 You have been given structured content extracted from a website.
@@ -133,6 +322,12 @@ IMPORTANT RULES:
 - Be concise, structured, and confident
 """
 
+
+async def ask_ai(user_question, website_context):
+    """
+    Streams the answer token by token so the UI can render it as it arrives.
+    Logs time-to-first-token (TTFT) for each call.
+    """
     user_prompt = f"""
 WEBSITE CONTENT:
 ----------------
@@ -149,15 +344,51 @@ INSTRUCTIONS:
 - Do not repeat the question
 """
 
-    response = client.chat.completions.create(
+    messages = [
+        {"role": "system", "content": _ASK_SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt}
+    ]
+    cache_key = make_key(AZURE_OPENAI_DEPLOYMENT_NAME, messages)
+    cached = llm_cache.get(cache_key)
+    if cached is not None:
+        yield cached
+        return
+
+    # Semantic lookup, scoped to this website's context
+    context_key = fingerprint(website_context)
+    embedding = await _embed(user_question)
+    if embedding is not None:
+        cached = semantic_cache.get(context_key, embedding)
+        if cached is not None:
+            logger.info("ask_ai semantic cache hit")
+            yield cached
+            return
+
+    t0 = perf_counter()
+    stream = _stream_completion(
         model=AZURE_OPENAI_DEPLOYMENT_NAME,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
+        messages=messages
     )
 
-    return response.choices[0].message.content
+    parts = []
+    async for chunk in stream:
+        # Azure may send chunks without choices (e.g. content filter results)
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if not delta:
+            continue
+        if not parts:
+            logger.info("ask_ai TTFT: %.2fs", perf_counter() - t0)
+        parts.append(delta)
+        yield delta
+
+    answer = "".join(parts)
+    # An empty stream (e.g. filtered content) is not worth replaying
+    if answer:
+        llm_cache.set(cache_key, answer)
+        if embedding is not None:
+            semantic_cache.add(context_key, embedding, answer)
 
 # ---------------- RFP MODE  ----------------
 
@@ -189,81 +420,213 @@ def _merge_rfp_batches(batches: list[dict]) -> dict:
     merged["overview"]["total_pages_analyzed"] = len(merged["pages"])
     
     # Merge page_types (aggregate counts by name)
+    # URL lists are kept as insertion-ordered dicts while merging, so dedup is a
+    # plain dict lookup and the batches' own lists are never mutated
     pt_map = {}
+    pt_urls = {}
     for batch in batches:
         for pt in batch.get("page_types", []):
             name = pt["name"]
             if name not in pt_map:
                 pt_map[name] = pt.copy()
+                pt_urls[name] = dict.fromkeys(pt.get("example_urls", []))
             else:
                 # Aggregate count
                 pt_map[name]["count"] = pt_map[name].get("count", 0) + pt.get("count", 0)
                 # Extend example URLs (deduplicate)
-                existing_urls = set(pt_map[name].get("example_urls", []))
-                new_urls = [u for u in pt.get("example_urls", []) if u not in existing_urls]
-                pt_map[name]["example_urls"].extend(new_urls[:3])  # Keep max 3 examples
+                seen = pt_urls[name]
+                seen.update(dict.fromkeys([u for u in pt.get("example_urls", []) if u not in seen][:3]))  # Keep max 3 examples
+    for name, pt in pt_map.items():
+        pt["example_urls"] = list(pt_urls[name])
     
     merged["page_types"] = list(pt_map.values())
     
     # Merge components (deduplicate by name, merge found_on_urls)
     comp_map = {}
+    comp_urls = {}
     for batch in batches:
         for comp in batch.get("components", []):
             name = comp["name"]
             if name not in comp_map:
                 comp_map[name] = comp.copy()
+                comp_urls[name] = dict.fromkeys(comp.get("found_on_urls", []))
             else:
-                # Merge found_on_urls (deduplicate)
-                existing = set(comp_map[name].get("found_on_urls", []))
-                new_urls = [u for u in comp.get("found_on_urls", []) if u not in existing]
-                comp_map[name]["found_on_urls"].extend(new_urls)
+                comp_urls[name].update(dict.fromkeys(comp.get("found_on_urls", [])))
+    for name, comp in comp_map.items():
+        comp["found_on_urls"] = list(comp_urls[name])
     
     merged["components"] = list(comp_map.values())
     
     # Merge third_party_integrations (deduplicate by name, merge detected_on_urls)
     int_map = {}
+    int_urls = {}
     for batch in batches:
         for integ in batch.get("third_party_integrations", []):
             name = integ["name"]
             if name not in int_map:
                 int_map[name] = integ.copy()
+                int_urls[name] = dict.fromkeys(integ.get("detected_on_urls", []))
             else:
-                existing = set(int_map[name].get("detected_on_urls", []))
-                new_urls = [u for u in integ.get("detected_on_urls", []) if u not in existing]
-                int_map[name]["detected_on_urls"].extend(new_urls)
+                int_urls[name].update(dict.fromkeys(integ.get("detected_on_urls", [])))
+    for name, integ in int_map.items():
+        integ["detected_on_urls"] = list(int_urls[name])
     
     merged["third_party_integrations"] = list(int_map.values())
     
-    # Merge recommendations (deduplicate)
-    rec_set = set()
+    # Merge recommendations (deduplicate, keeping first-seen order)
+    rec_seen = {}
     for batch in batches:
-        for rec in batch.get("recommendations", []):
-            rec_set.add(rec)
-    merged["recommendations"] = list(rec_set)
+        rec_seen.update(dict.fromkeys(batch.get("recommendations", [])))
+    merged["recommendations"] = list(rec_seen)
     
     return merged
 
 
-def _filter_context_by_urls(context: str, urls: list[str]) -> str:
+def _index_context_by_url(context: str) -> dict[str, str]:
     """
-    Filters website context to include only sections related to the given URLs.
+    Splits website context into per-page sections keyed by the URL on each
+    "[URL] <url>" marker line (the marker line is kept in its section).
+    Parsed once per analysis so every batch is a handful of dict lookups.
     """
-    lines = context.split("\n")
-    filtered = []
-    include = False
-    
-    for line in lines:
+    index: dict[str, str] = {}
+    url = None
+    buf: list[str] = []
+    for line in context.split("\n"):
         if line.startswith("[URL]"):
-            # Check if this URL is in our batch
-            include = any(url in line for url in urls)
-        
-        if include:
-            filtered.append(line)
-    
-    return "\n".join(filtered)
+            if url is not None:
+                index[url] = "\n".join(buf)
+            url = line[5:].strip()
+            buf = []
+        if url is not None:
+            buf.append(line)
+    if url is not None:
+        index[url] = "\n".join(buf)
+    return index
+
+
+def _budget_context(context: str, urls: list[str], sections: dict[str, str] | None = None) -> str:
+    """
+    Builds the website content for one RFP request within RFP_CONTEXT_CHAR_BUDGET:
+    each URL's section is capped at an equal share of the budget, so one long page
+    cannot crowd out the rest of the batch.
+    """
+    if sections is None:
+        sections = _index_context_by_url(context)
+    if not sections:
+        return context[:RFP_CONTEXT_CHAR_BUDGET]
+    per_url = RFP_CONTEXT_CHAR_BUDGET // max(1, len(urls))
+    return "\n".join(sections[u][:per_url] for u in urls if u in sections)
 
 
-def generate_rfp_analysis(website_context: str, crawled_urls: list[str], batch_size: int = None) -> dict:
+def _dedupe_identical_pages(urls: list[str], sections: dict[str, str]) -> tuple[list[str], dict[str, list[str]]]:
+    """
+    Groups URLs whose page text is identical (shared templates, mirrored paths).
+    Takes the raw (uncompacted) sections: compaction drops repeated lines, which
+    would leave a duplicate page with no text to compare.
+    Returns the URLs to analyze (first of each group, in order) and a map of
+    representative URL -> the duplicate URLs it stands for.
+    """
+    rep_by_hash: dict[bytes, str] = {}
+    duplicates: defaultdict[str, list[str]] = defaultdict(list)
+    unique: list[str] = []
+    for u in urls:
+        section = sections.get(u, "")
+        body = section.partition("\n")[2].strip()
+        if not body:
+            unique.append(u)
+            continue
+        digest = hashlib.blake2b(body.encode("utf-8"), digest_size=16).digest()
+        rep = rep_by_hash.get(digest)
+        if rep is None:
+            rep_by_hash[digest] = u
+            unique.append(u)
+        else:
+            duplicates[rep].append(u)
+    return unique, dict(duplicates)
+
+
+def _fan_out_duplicate_pages(data: dict, duplicates: dict[str, list[str]]) -> dict:
+    """Copies each analyzed page record onto the URLs that had an identical body."""
+    if not duplicates:
+        return data
+    pages = data.get("pages", []) or []
+    extra = []
+    added_per_type: defaultdict[str, int] = defaultdict(int)
+    for p in pages:
+        dups = duplicates.get(p.get("url"))
+        if not dups:
+            continue
+        extra.extend({**p, "url": u} for u in dups)
+        added_per_type[p.get("page_type")] += len(dups)
+    pages.extend(extra)
+    data["pages"] = pages
+    for pt in data.get("page_types", []) or []:
+        pt["count"] = pt.get("count", 0) + added_per_type.get(pt.get("name"), 0)
+    if isinstance(data.get("overview"), dict):
+        data["overview"]["total_pages_analyzed"] = len(pages)
+    return data
+
+
+def _pack_batches(urls: list[str], sections: dict[str, str], max_urls: int, char_budget: int) -> list[list[str]]:
+    """
+    Greedily packs URLs (in crawl order) into batches of at most max_urls whose
+    combined page content stays within char_budget, so dense pages get smaller
+    batches and sparse ones are not split needlessly.
+    """
+    batches: list[list[str]] = []
+    current: list[str] = []
+    used = 0
+    for u in urls:
+        size = len(sections.get(u, ""))
+        if current and (len(current) >= max_urls or used + size > char_budget):
+            batches.append(current)
+            current, used = [], 0
+        current.append(u)
+        used += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _default_batch_size(url_count: int) -> int:
+    """Dynamic batch sizing based on total URL count."""
+    if url_count <= 100:
+        return url_count  # Single batch
+    if url_count <= 500:
+        return 100  # Standard batch size
+    if url_count <= 1000:
+        return 80   # Smaller batches for better reliability
+    return 50   # Very small batches for extremely large sites
+
+
+def _plan_rfp_batches(website_context: str, urls: list[str], batch_size: int) -> tuple[list[list[str]], dict[str, str], dict[str, list[str]]]:
+    """
+    Splits the raw context into pages, sets aside pages whose text duplicates an
+    earlier one and packs the rest into batches by URL count and content size.
+    Returns (url_batches, compacted sections by URL, duplicates by representative URL).
+    """
+    # Split into pages before compacting, so identical pages still carry their text
+    # when they are compared; each page is then compacted on its own
+    raw_sections = _index_context_by_url(website_context)
+    analysis_urls, duplicates = _dedupe_identical_pages(urls, raw_sections)
+    sections = {u: _compact_context(section) for u, section in raw_sections.items()}
+    return _pack_batches(analysis_urls, sections, batch_size, RFP_CONTEXT_CHAR_BUDGET), sections, duplicates
+
+
+def estimate_rfp_seconds(url_count: int, context_chars: int) -> tuple[int, int]:
+    """
+    Cheap (low, high) duration estimate for generate_rfp_analysis, without
+    parsing the context: batches are bounded by both the default batch size and
+    RFP_CONTEXT_CHAR_BUDGET, and run RFP_BATCH_CONCURRENCY at a time.
+    """
+    batch_size = max(1, _default_batch_size(url_count))
+    num_batches = max(1, -(-url_count // batch_size), -(-context_chars // RFP_CONTEXT_CHAR_BUDGET))
+    waves = -(-num_batches // RFP_BATCH_CONCURRENCY)
+    low, high = RFP_SECONDS_PER_WAVE
+    return waves * low, waves * high
+
+
+async def generate_rfp_analysis(website_context: str, crawled_urls: list[str], batch_size: int = None) -> dict:
     """
     Generates structured RFP-ready website analysis.
     Automatically splits large crawls into batches to avoid token limits.
@@ -271,90 +634,105 @@ def generate_rfp_analysis(website_context: str, crawled_urls: list[str], batch_s
     """
 
     # Build authoritative URL index
-    urls = sorted(set(crawled_urls or re.findall(r'https?://[^\s)"\']+', website_context)))
+    urls = list(dict.fromkeys(crawled_urls or _URL_RE.findall(website_context)))
     url_count = len(urls)
     
     if url_count == 0:
         raise ValueError("No URLs available. Provide crawled_urls or ensure context contains URLs.")
+
+    compacted = _compact_context(website_context)
+
+    # Identical (normalised) context + URL set + batching -> reuse the previous analysis
+    fp = hashlib.blake2b(digest_size=16)
+    fp.update(compacted.encode("utf-8"))
+    fp.update("\n".join(urls).encode("utf-8"))
+    fp.update(str(batch_size).encode("utf-8"))
+    result_key = "rfp:" + fp.hexdigest()
+    cached = rfp_result_cache.get(result_key)
+    if cached is not None:
+        logger.info("Reusing cached RFP analysis for %d URLs", url_count)
+        return copy.deepcopy(cached)
     
-    # Dynamic batch sizing based on total URL count
     if batch_size is None:
-        if url_count <= 100:
-            batch_size = url_count  # Single batch
-        elif url_count <= 500:
-            batch_size = 100  # Standard batch size
-        elif url_count <= 1000:
-            batch_size = 80   # Smaller batches for better reliability
-        else:
-            batch_size = 50   # Very small batches for extremely large sites
+        batch_size = _default_batch_size(url_count)
     
-    print(f"INFO: Total URLs to analyze: {url_count}, Batch size: {batch_size}")
+    logger.info("Total URLs to analyze: %d, Batch size: %d", url_count, batch_size)
+
+    # Pages with identical text are analyzed once and their record copied afterwards;
+    # batches are packed by content size and pick their pages by URL
+    url_batches, sections, duplicates = _plan_rfp_batches(website_context, urls, batch_size)
+    if duplicates:
+        logger.info("Skipping %d pages whose content duplicates another page", sum(map(len, duplicates.values())))
+    num_batches = len(url_batches)
+
+    # Caps concurrent requests to respect Azure rate limits, including the re-run
+    # halves of any batch truncated at the token limit
+    slots = asyncio.Semaphore(RFP_BATCH_CONCURRENCY)
     
     # Determine if batching is needed
-    if url_count <= batch_size:
-        print(f"INFO: Analyzing {url_count} URLs in a single batch")
-        return _generate_rfp_batch(website_context, urls, url_count, 1, 1)
+    if num_batches == 1:
+        analysis_urls = url_batches[0]
+        logger.info("Analyzing %d URLs in a single batch", len(analysis_urls))
+        result = await _generate_rfp_batch(
+            _budget_context(compacted, analysis_urls, sections), analysis_urls, len(analysis_urls), 1, 1, slots
+        )
+        result = _fan_out_duplicate_pages(result, duplicates)
+        rfp_result_cache.set(result_key, copy.deepcopy(result))
+        return result
     
     # Split into batches
-    num_batches = (url_count + batch_size - 1) // batch_size
-    print(f"INFO: Splitting {url_count} URLs into {num_batches} batches of ~{batch_size}")
-    print(f"INFO: Estimated processing time: {num_batches * 15}-{num_batches * 30} seconds")
-    
+    logger.info("Splitting %d URLs into %d batches of <=%d URLs / %d chars", url_count, num_batches, batch_size, RFP_CONTEXT_CHAR_BUDGET)
+    waves = (num_batches + RFP_BATCH_CONCURRENCY - 1) // RFP_BATCH_CONCURRENCY
+    low, high = RFP_SECONDS_PER_WAVE
+    logger.info("Estimated processing time: %d-%d seconds (%d batches in parallel)", waves * low, waves * high, RFP_BATCH_CONCURRENCY)
+
+    # Batches are independent: run them concurrently, capped by the shared slots
+    async def _run_batch(i: int) -> dict:
+        batch_urls = url_batches[i]
+
+        # Extract context for this batch (filter by URLs, within the content budget)
+        batch_context = _budget_context(compacted, batch_urls, sections)
+
+        logger.info("Queued batch %d/%d (%d URLs)", i + 1, num_batches, len(batch_urls))
+        return await _generate_rfp_batch(batch_context, batch_urls, len(batch_urls), i+1, num_batches, slots)
+
+    results = await asyncio.gather(*(_run_batch(i) for i in range(num_batches)), return_exceptions=True)
+
     batches = []
-    for i in range(num_batches):
-        start_idx = i * batch_size
-        end_idx = min((i + 1) * batch_size, url_count)
-        batch_urls = urls[start_idx:end_idx]
-        
-        print(f"INFO: Processing batch {i+1}/{num_batches} ({len(batch_urls)} URLs) - Progress: {int((i/num_batches)*100)}%")
-        
-        # Extract context for this batch (filter by URLs)
-        batch_context = _filter_context_by_urls(website_context, batch_urls)
-        
-        try:
-            batch_result = _generate_rfp_batch(batch_context, batch_urls, len(batch_urls), i+1, num_batches)
-            batches.append(batch_result)
-            print(f"SUCCESS: Batch {i+1}/{num_batches} completed with {len(batch_result.get('pages', []))} pages")
-        except Exception as e:
-            print(f"WARNING: Batch {i+1}/{num_batches} failed: {e}. Continuing with partial results...")
+    for i, batch_result in enumerate(results):
+        if isinstance(batch_result, Exception):
+            logger.warning("Batch %d/%d failed: %s. Continuing with partial results...", i + 1, num_batches, batch_result)
             continue
+        batches.append(batch_result)
+        logger.info("Batch %d/%d completed with %d pages", i + 1, num_batches, len(batch_result.get("pages", [])))
     
     if not batches:
         raise ValueError("All batches failed. Try reducing max_pages or batch_size.")
     
-    print(f"INFO: Merging {len(batches)} successful batches...")
-    merged = _merge_rfp_batches(batches)
+    logger.info("Merging %d successful batches...", len(batches))
+    merged = _fan_out_duplicate_pages(_merge_rfp_batches(batches), duplicates)
     
-    print(f"SUCCESS: Final analysis covers {len(merged.get('pages', []))} pages")
+    logger.info("Final analysis covers %d pages", len(merged.get("pages", [])))
     # Post-process to annotate reusable components and map components to page types
-    return _annotate_components_and_page_types(merged)
-
+    result = _annotate_components_and_page_types(merged)
+    # Only cache complete analyses so a partial run is retried next time
+    if len(batches) == num_batches:
+        rfp_result_cache.set(result_key, copy.deepcopy(result))
+    return result
 
-def _generate_rfp_batch(website_context: str, urls: list[str], url_count: int, batch_num: int = 1, total_batches: int = 1) -> dict:
-    """
-    Generates RFP analysis for a single batch of URLs.
-    """
-    if total_batches > 1:
-        print(f"DEBUG: Batch {batch_num}/{total_batches} - Analyzing {url_count} URLs")
-    
-    url_index_text = "\n".join(f"- {u}" for u in urls)
 
-    prompt = f"""
+# Static instructions go first as a system message so the provider can reuse
+# the cached prompt prefix; per-batch data goes last in the user message.
+_RFP_SYSTEM_PROMPT = """
 You are acting as a SENIOR CMS SOLUTION ARCHITECT preparing a
 DETAILED RFP ANALYSIS DOCUMENT.
 
-CRITICAL: Analyze EVERY SINGLE URL provided below.
-
-------------------------------------------------------------
-CRAWLED URL INDEX (AUTHORITATIVE – USE EXACTLY THESE URLs)
-------------------------------------------------------------
-Total URLs: {url_count}
-{url_index_text}
+CRITICAL: Analyze EVERY SINGLE URL in the CRAWLED URL INDEX provided in the user message.
 
 You MUST:
-- Create one 'pages' entry for EVERY URL in the index above (no omissions, no merges)
-- Set 'total_pages_analyzed' to {url_count}
-- Ensure the sum of 'page_types[].count' == {url_count}
+- Create one 'pages' entry for EVERY URL in the index (no omissions, no merges)
+- Set 'total_pages_analyzed' to the index's Total URLs
+- Ensure the sum of 'page_types[].count' == Total URLs
 - If a page type is unclear, use "Unknown" but still include the page
 - Do NOT invent URLs or pages not present in the index
 - Use only URLs from the index in 'example_urls' and 'found_on_urls'
@@ -362,24 +740,24 @@ You MUST:
 ------------------------------------------------------------
 OUTPUT FORMAT (STRICT – MUST MATCH EXACTLY)
 ------------------------------------------------------------
-{{
-  "overview": {{
+{
+  "overview": {
     "website_purpose": "",
     "industry": "",
     "overall_structure": "",
-    "total_pages_analyzed": {url_count}
-  }},
+    "total_pages_analyzed": 0
+  },
   "page_types": [
-    {{
+    {
       "name": "",
       "description": "",
       "example_urls": [],
       "complexity": "Low | Medium | High",
       "count": 0
-    }}
+    }
   ],
   "components": [
-    {{
+    {
       "name": "",
       "description": "",
       "used_on_pages": "",
@@ -390,41 +768,41 @@ OUTPUT FORMAT (STRICT – MUST MATCH EXACTLY)
       "third_party_dependency": "",
       "complexity": "Low | Medium | High",
       "effort_estimate_days": ""
-    }}
+    }
   ],
   "pages": [
-    {{
+    {
       "url": "",
       "page_type": "",
       "components": [],
       "complexity": "Low | Medium | High",
       "notes": ""
-    }}
+    }
   ],
   "third_party_integrations": [
-    {{
+    {
       "name": "",
       "category": "Analytics | Marketing | Media | CDN | Authentication | Payment | Chat | Social | Other",
       "purpose": "",
       "evidence_or_inference": "",
       "detected_on_urls": []
-    }}
+    }
   ],
   "recommendations": []
-}}
+}
 
 ------------------------------------------------------------
 ANALYSIS INSTRUCTIONS (MANDATORY – READ CAREFULLY)
 ------------------------------------------------------------
 
 STEP 1: PAGE ENUMERATION
-- Iterate through the CRAWLED URL INDEX above
+- Iterate through the CRAWLED URL INDEX
 - Produce one 'pages' entry per URL, preserving the exact URL string
 
 STEP 2: PAGE TYPE CLASSIFICATION
 - Classify each page into one logical type
 - Common types: Homepage/Landing, Product/Service Detail, Category/Listing, Blog/News/Article, About/Team/Company, Contact/Form, FAQ/Support, Legal/Policy, Search Results, User Account/Dashboard, Unknown
-- Sum of 'page_types.count' MUST equal {url_count}
+- Sum of 'page_types.count' MUST equal Total URLs
 
 STEP 3: COMPONENT IDENTIFICATION (UNBOUNDED, UX-LED)
 - Act as a senior UX designer: infer components from visual layout, information architecture, and content structure for EACH page.
@@ -444,129 +822,209 @@ STEP 4: THIRD-PARTY INTEGRATION DETECTION (OPEN-ENDED)
 
 STEP 5: QUALITY & STRICTNESS
 - Output ONLY valid JSON
-- 'total_pages_analyzed' MUST be {url_count}
-- 'pages' array MUST contain exactly {url_count} entries
-
-WEBSITE CONTENT (REFERENCE SOURCE):
-{website_context}
+- 'total_pages_analyzed' MUST be Total URLs
+- 'pages' array MUST contain exactly Total URLs entries
 """
 
-    # Define a function tool schema to force JSON output
-    rfp_function = {
-        "type": "function",
-        "function": {
-            "name": "submit_rfp",
-            "description": "Return the structured RFP analysis as a strict JSON object.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "overview": {
+# Define a function tool schema to force JSON output
+_RFP_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "submit_rfp",
+        "description": "Return the structured RFP analysis as a strict JSON object.",
+        # Structured Outputs: arguments are guaranteed to match the schema
+        "strict": True,
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "overview": {
+                    "type": "object",
+                    "properties": {
+                        "website_purpose": {"type": "string"},
+                        "industry": {"type": "string"},
+                        "overall_structure": {"type": "string"},
+                        "total_pages_analyzed": {"type": "number"}
+                    },
+                    "required": ["website_purpose", "industry", "overall_structure", "total_pages_analyzed"],
+                    "additionalProperties": False
+                },
+                "page_types": {
+                    "type": "array",
+                    "items": {
                         "type": "object",
                         "properties": {
-                            "website_purpose": {"type": "string"},
-                            "industry": {"type": "string"},
-                            "overall_structure": {"type": "string"},
-                            "total_pages_analyzed": {"type": "number"}
+                            "name": {"type": "string"},
+                            "description": {"type": "string"},
+                            "example_urls": {"type": "array", "items": {"type": "string"}},
+                            "complexity": {"type": "string"},
+                            "count": {"type": "number"}
                         },
-                        "required": ["website_purpose", "industry", "overall_structure", "total_pages_analyzed"]
-                    },
-                    "page_types": {
-                        "type": "array",
-                        "items": {
-                            "type": "object",
-                            "properties": {
-                                "name": {"type": "string"},
-                                "description": {"type": "string"},
-                                "example_urls": {"type": "array", "items": {"type": "string"}},
-                                "complexity": {"type": "string"},
-                                "count": {"type": "number"}
-                            },
-                            "required": ["name", "description", "example_urls", "complexity", "count"]
-                        }
-                    },
-                    "components": {
-                        "type": "array",
-                        "items": {
-                            "type": "object",
-                            "properties": {
-                                "name": {"type": "string"},
-                                "description": {"type": "string"},
-                                "used_on_pages": {"type": "string"},
-                                "found_on_urls": {"type": "array", "items": {"type": "string"}},
-                                "media_type": {"type": "string"},
-                                "media_count": {"type": "string"},
-                                "cms_managed": {"type": "string"},
-                                "third_party_dependency": {"type": "string"},
-                                "complexity": {"type": "string"},
-                                "effort_estimate_days": {"type": "string"}
-                            },
-                            "required": [
-                                "name","description","used_on_pages","found_on_urls","media_type","media_count","cms_managed","third_party_dependency","complexity","effort_estimate_days"
-                            ]
-                        }
-                    },
-                    "pages": {
-                        "type": "array",
-                        "items": {
-                            "type": "object",
-                            "properties": {
-                                "url": {"type": "string"},
-                                "page_type": {"type": "string"},
-                                "components": {"type": "array", "items": {"type": "string"}},
-                                "complexity": {"type": "string"},
-                                "notes": {"type": "string"}
-                            },
-                            "required": ["url", "page_type", "components", "complexity", "notes"]
-                        }
-                    },
-                    "third_party_integrations": {
-                        "type": "array",
-                        "items": {
-                            "type": "object",
-                            "properties": {
-                                "name": {"type": "string"},
-                                "category": {"type": "string"},
-                                "purpose": {"type": "string"},
-                                "evidence_or_inference": {"type": "string"},
-                                "detected_on_urls": {"type": "array", "items": {"type": "string"}}
-                            },
-                            "required": ["name", "category", "purpose", "evidence_or_inference", "detected_on_urls"]
-                        }
-                    },
-                    "recommendations": {"type": "array", "items": {"type": "string"}}
+                        "required": ["name", "description", "example_urls", "complexity", "count"],
+                        "additionalProperties": False
+                    }
+                },
+                "components": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "name": {"type": "string"},
+                            "description": {"type": "string"},
+                            "used_on_pages": {"type": "string"},
+                            "found_on_urls": {"type": "array", "items": {"type": "string"}},
+                            "media_type": {"type": "string"},
+                            "media_count": {"type": "string"},
+                            "cms_managed": {"type": "string"},
+                            "third_party_dependency": {"type": "string"},
+                            "complexity": {"type": "string"},
+                            "effort_estimate_days": {"type": "string"}
+                        },
+                        "required": [
+                            "name","description","used_on_pages","found_on_urls","media_type","media_count","cms_managed","third_party_dependency","complexity","effort_estimate_days"
+                        ],
+                        "additionalProperties": False
+                    }
                 },
-                "required": [
-                    "overview", "page_types", "components", "pages", "third_party_integrations", "recommendations"
-                ]
-            }
+                "pages": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "url": {"type": "string"},
+                            "page_type": {"type": "string"},
+                            "components": {"type": "array", "items": {"type": "string"}},
+                            "complexity": {"type": "string"},
+                            "notes": {"type": "string"}
+                        },
+                        "required": ["url", "page_type", "components", "complexity", "notes"],
+                        "additionalProperties": False
+                    }
+                },
+                "third_party_integrations": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "name": {"type": "string"},
+                            "category": {"type": "string"},
+                            "purpose": {"type": "string"},
+                            "evidence_or_inference": {"type": "string"},
+                            "detected_on_urls": {"type": "array", "items": {"type": "string"}}
+                        },
+                        "required": ["name", "category", "purpose", "evidence_or_inference", "detected_on_urls"],
+                        "additionalProperties": False
+                    }
+                },
+                "recommendations": {"type": "array", "items": {"type": "string"}}
+            },
+            "required": [
+                "overview", "page_types", "components", "pages", "third_party_integrations", "recommendations"
+            ],
+            "additionalProperties": False
         }
     }
+}
 
-    response = client.chat.completions.create(
-        model=AZURE_OPENAI_DEPLOYMENT_NAME,
-        messages=[{"role": "user", "content": prompt}],
-        max_completion_tokens=16000,
-        tools=[rfp_function],
-        tool_choice={"type": "function", "function": {"name": "submit_rfp"}}
-    )
 
-    message = response.choices[0].message
+async def _generate_rfp_batch(website_context: str, urls: list[str], url_count: int, batch_num: int = 1, total_batches: int = 1, slots: asyncio.Semaphore | None = None) -> dict:
+    """
+    Generates RFP analysis for a single batch of URLs.
+    `slots` caps concurrent requests (RFP_BATCH_CONCURRENCY) across all batches,
+    including the halves a truncated batch is re-run as.
+    """
+    if total_batches > 1:
+        logger.debug("Batch %d/%d - Analyzing %d URLs", batch_num, total_batches, url_count)
     
+    url_index_text = "- " + "\n- ".join(urls) if urls else ""
+
+    user_prompt = f"""
+------------------------------------------------------------
+CRAWLED URL INDEX (AUTHORITATIVE – USE EXACTLY THESE URLs)
+------------------------------------------------------------
+Total URLs: {url_count}
+{url_index_text}
+
+WEBSITE CONTENT (REFERENCE SOURCE):
+{website_context}
+"""
+
+    messages = [
+        {"role": "system", "content": _RFP_SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt}
+    ]
+    request_opts = {
+        "max_completion_tokens": 16000,
+        "tools": [_RFP_TOOL],
+        "tool_choice": {"type": "function", "function": {"name": "submit_rfp"}},
+    }
+    cache_key = make_key(AZURE_OPENAI_DEPLOYMENT_NAME, messages, **request_opts)
+    # Only successfully parsed batches are cached (as orjson bytes, so each hit
+    # gets a fresh dict), so a rerun after a failure retries just the bad batches
+    cached = llm_cache.get(cache_key)
+    if cached is not None:
+        return orjson.loads(cached)
+
+    # Hold a concurrency slot only while the request streams, so the halves of a
+    # truncated batch (below) can take their own slots without deadlocking
+    async with slots or contextlib.nullcontext():
+        t0 = perf_counter()
+        stream = _stream_completion(
+            model=AZURE_OPENAI_DEPLOYMENT_NAME,
+            messages=messages,
+            **request_opts
+        )
+
+        # Buffer streamed tool-call arguments / content; JSON is parsed once complete
+        args_buf = StringIO()
+        content_buf = StringIO()
+        first_token = True
+        finish_reason = None
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            finish_reason = chunk.choices[0].finish_reason or finish_reason
+            delta = chunk.choices[0].delta
+            got_token = False
+            for tc in delta.tool_calls or []:
+                if tc.index == 0 and tc.function and tc.function.arguments:
+                    args_buf.write(tc.function.arguments)
+                    got_token = True
+            if delta.content:
+                content_buf.write(delta.content)
+                got_token = True
+            if got_token and first_token:
+                logger.info("RFP batch %d/%d TTFT: %.2fs", batch_num, total_batches, perf_counter() - t0)
+                first_token = False
+        logger.info("RFP batch %d/%d streamed %d chars in %.2fs", batch_num, total_batches, args_buf.tell() + content_buf.tell(), perf_counter() - t0)
+
+    args, raw_content = args_buf.getvalue(), content_buf.getvalue()
+
+    # Output hit the token limit: re-run the batch as two halves rather than salvaging
+    # a cut-off payload (which silently drops every page after the cut)
+    if finish_reason == "length" and url_count > 1:
+        logger.warning("RFP batch %d/%d truncated at the token limit; splitting %d URLs in two", batch_num, total_batches, url_count)
+        mid = url_count // 2
+        halves = await asyncio.gather(
+            _generate_rfp_batch(_budget_context(website_context, urls[:mid]), urls[:mid], mid, batch_num, total_batches, slots),
+            _generate_rfp_batch(_budget_context(website_context, urls[mid:]), urls[mid:], url_count - mid, batch_num, total_batches, slots)
+        )
+        data = _merge_rfp_batches(list(halves))
+        llm_cache.set(cache_key, orjson.dumps(data))
+        return data
+
     # Prefer tool call JSON if provided
-    tool_calls = getattr(message, "tool_calls", None)
-    if tool_calls and len(tool_calls) > 0:
-        args = tool_calls[0].function.arguments
-        # Detect truncation
-        if not args.rstrip().endswith("}"):
-            print(f"WARNING: Tool call arguments appear truncated. Attempting repair...")
-            args = args.rstrip().rstrip(",") + "]}}"  
+    if args:
+        # The stream reports truncation directly; no need to guess from the last character
+        if finish_reason == "length":
+            logger.warning("Tool call arguments truncated at the token limit. Attempting repair...")
+            args = _close_truncated_json(args) or args
         try:
-            data = json.loads(args)
-        except json.JSONDecodeError as e:
-            print(f"WARNING: Parse failed, attempting sanitization...")
+            data = orjson.loads(args)
+        except json.JSONDecodeError:
+            logger.warning("Parse failed, attempting sanitization...")
             data = _safe_json_loads(args)
     else:
-        raw = message.content.strip() if message.content else ""
+        raw = raw_content.strip()
         if not raw:
             raise ValueError("Empty AI response")
         data = _safe_json_loads(raw)
@@ -584,6 +1042,7 @@ WEBSITE CONTENT (REFERENCE SOURCE):
     if "recommendations" not in data:
         data["recommendations"] = []
 
+    llm_cache.set(cache_key, orjson.dumps(data))
     return data
 
 
@@ -598,50 +1057,33 @@ def _annotate_components_and_page_types(data: dict) -> dict:
     page_types = data.get("page_types", []) or []
 
     # Build usage maps
-    comp_to_page_types: dict[str, set] = {}
-    pt_to_components: dict[str, set] = {}
+    comp_to_page_types: defaultdict[str, set] = defaultdict(set)
+    pt_to_components: defaultdict[str, set] = defaultdict(set)
 
     # Map URL to page type for fallback enrichment
     url_to_pt: dict[str, str] = {}
     for p in pages:
         pt = (p.get("page_type") or "Unknown").strip() or "Unknown"
         comps = p.get("components", []) or []
-        if pt not in pt_to_components:
-            pt_to_components[pt] = set()
+        pt_comps = pt_to_components[pt]
         for c in comps:
             if not isinstance(c, str):
                 continue
             cname = c.strip()
             if not cname:
                 continue
-            pt_to_components[pt].add(cname)
-            comp_to_page_types.setdefault(cname, set()).add(pt)
+            pt_comps.add(cname)
+            comp_to_page_types[cname].add(pt)
         url = p.get("url")
         if isinstance(url, str) and url:
             url_to_pt[url] = pt
 
-    # Mark reusable on components list
+    # Mark reusable on components list (from page-level usage, before enrichment)
     for comp in components:
         name = (comp.get("name") or "").strip()
-        pts = comp_to_page_types.get(name, set())
+        pts = comp_to_page_types.get(name, ())
         comp["reusable"] = "Yes" if len(pts) > 1 else "No"
 
-    # Inject component mapping summaries into page_types entries
-    # Create index for quick lookup
-    name_to_pt_obj = { (pt.get("name") or "Unknown"): pt for pt in page_types }
-    for pt_name, comp_set in pt_to_components.items():
-        pt_obj = name_to_pt_obj.get(pt_name)
-        if not pt_obj:
-            # If AI didn't emit this page type, create a minimal entry
-            pt_obj = {"name": pt_name, "description": "", "example_urls": [], "complexity": "", "count": 0}
-            page_types.append(pt_obj)
-            name_to_pt_obj[pt_name] = pt_obj
-        comp_list = sorted(comp_set)
-        reusable_list = [c for c in comp_list if len(comp_to_page_types.get(c, set())) > 1]
-        pt_obj["components_all"] = ", ".join(comp_list)
-        pt_obj["components_reusable"] = ", ".join(sorted(reusable_list))
-        pt_obj["component_count"] = len(comp_list)
-
     # Fallback enrichment: use components[].found_on_urls to add components to page types
     for comp in components:
         cname = (comp.get("name") or "").strip()
@@ -650,20 +1092,23 @@ def _annotate_components_and_page_types(data: dict) -> dict:
             pt = url_to_pt.get(u)
             if not pt:
                 continue
-            pt_to_components.setdefault(pt, set()).add(cname)
-            comp_to_page_types.setdefault(cname, set()).add(pt)
+            pt_to_components[pt].add(cname)
+            comp_to_page_types[cname].add(pt)
 
-    # Recompute page type summaries after enrichment
+    # Inject component mapping summaries into page_types entries (once, after enrichment)
+    # Create index for quick lookup
+    name_to_pt_obj = { (pt.get("name") or "Unknown"): pt for pt in page_types }
     for pt_name, comp_set in pt_to_components.items():
         pt_obj = name_to_pt_obj.get(pt_name)
         if not pt_obj:
+            # If AI didn't emit this page type, create a minimal entry
             pt_obj = {"name": pt_name, "description": "", "example_urls": [], "complexity": "", "count": 0}
             page_types.append(pt_obj)
             name_to_pt_obj[pt_name] = pt_obj
         comp_list = sorted(comp_set)
-        reusable_list = [c for c in comp_list if len(comp_to_page_types.get(c, set())) > 1]
+        reusable_list = [c for c in comp_list if len(comp_to_page_types[c]) > 1]
         pt_obj["components_all"] = ", ".join(comp_list)
-        pt_obj["components_reusable"] = ", ".join(sorted(reusable_list))
+        pt_obj["components_reusable"] = ", ".join(reusable_list)
         pt_obj["component_count"] = len(comp_list)
 
     # Ensure structures are set back
@@ -674,19 +1119,10 @@ def _annotate_components_and_page_types(data: dict) -> dict:
 
 # ---------------- suggested questions ----------------
 
-import re
-
-
-def generate_suggested_questions(website_context: str) -> list[str]:
-    """
-    Generates smart, context-aware suggested questions for the chatbot UI.
-    Always returns a safe list.
-    """
-
-    prompt = f"""
+_QUESTIONS_SYSTEM_PROMPT = """
 You are an expert CMS analyst.
 
-Based on the website content below, generate 6 to 8
+Based on the website content provided by the user, generate 6 to 8
 useful, practical questions a user might ask to understand:
 - Page types
 - Components
@@ -698,36 +1134,41 @@ Rules:
 - Questions must be specific to this website
 - Questions must be short and clear
 - Do NOT number them
-- Return ONLY a JSON array of strings (no explanation text)
-
-WEBSITE CONTENT:
-{website_context}
+- Return ONLY a JSON object of the form {"questions": ["...", "..."]} (no explanation text)
 """
 
-    response = client.chat.completions.create(
-        model=AZURE_OPENAI_DEPLOYMENT_NAME,
-        messages=[{"role": "user", "content": prompt}]
+
+async def generate_suggested_questions(website_context: str, model: str | None = None) -> list[str]:
+    """
+    Generates smart, context-aware suggested questions for the chatbot UI.
+    Runs on the fast deployment unless a model is given.
+    Always returns a safe list.
+    """
+    messages = [
+        {"role": "system", "content": _QUESTIONS_SYSTEM_PROMPT},
+        {"role": "user", "content": f"WEBSITE CONTENT:\n{_compact_context(website_context)}"}
+    ]
+    # JSON mode guarantees a parseable object, so no regex salvage is needed
+    raw = await chat_completion(
+        messages,
+        model=model or AZURE_OPENAI_FAST_DEPLOYMENT_NAME,
+        json_mode=True,
+        validate=lambda reply: _parse_questions(reply) is not None
     )
+    return _parse_questions(raw) or []
 
-    raw = response.choices[0].message.content.strip()
 
-    # Empty response
+def _parse_questions(raw: str) -> list[str] | None:
+    """Question strings from a model reply, or None if the reply is unusable."""
     if not raw:
-        return []
+        return None
 
-    # Extract JSON array if wrapped in text
     try:
-        return json.loads(raw)
+        data = orjson.loads(raw)
     except json.JSONDecodeError:
-        pass
-
-    #  Regex extract [ ... ]
-    match = re.search(r"\[[\s\S]*\]", raw)
-    if match:
-        try:
-            return json.loads(match.group())
-        except json.JSONDecodeError:
-            pass
+        return None
 
-    # Fallback
-    return []
+    questions = data.get("questions", []) if isinstance(data, dict) else data
+    if not isinstance(questions, list):
+        return None
+    return [q for q in questions if isinstance(q, str)]
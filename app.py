@@ -1,6 +1,6 @@
 import asyncio
 import sys
-import pandas as pd
+import xlsxwriter
 from io import BytesIO
 from dotenv import load_dotenv
 load_dotenv(override=True)  # This reloads .env file each time
@@ -9,9 +9,6 @@ load_dotenv(override=True)  # This reloads .env file each time
 if sys.platform.startswith("win"):
     asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
 
-import nest_asyncio
-nest_asyncio.apply()  # Allow nested event loops for Streamlit
-
 # Ensure Playwright browsers are installed on startup
 import subprocess
 import os
@@ -20,13 +17,18 @@ import pathlib
 
 def ensure_playwright_browsers():
     """Install Playwright browsers if not already installed."""
+    # The script reruns on every interaction: after the first successful check a
+    # sentinel file turns this into a single stat instead of a recursive glob
+    browsers_path = pathlib.Path.home() / ".cache" / "ms-playwright"
+    sentinel = browsers_path / ".cmsautomatex-installed"
+    if sentinel.exists():
+        return
     try:
         # Check if chromium executable exists
-        browsers_path = pathlib.Path.home() / ".cache" / "ms-playwright"
         if browsers_path.exists():
             # Check for chromium
-            chromium_paths = list(browsers_path.glob("**/chrome-headless-shell"))
-            if chromium_paths:
+            if next(browsers_path.glob("**/chrome-headless-shell"), None):
+                sentinel.touch()
                 return  # Browsers already installed
         
         # Install browsers
@@ -46,6 +48,7 @@ def ensure_playwright_browsers():
             print(f"Playwright installation stderr: {result.stderr}")
         else:
             print("Playwright browsers installed successfully")
+            sentinel.touch()
             
     except subprocess.TimeoutExpired:
         print("Playwright installation timed out, will retry on next run")
@@ -57,12 +60,81 @@ ensure_playwright_browsers()
     
 import streamlit as st
 from crawler import crawl_website
-from ai_service import ask_ai, generate_suggested_questions
+from ai_service import ask_ai, estimate_rfp_seconds
 from suggested_questions_service import get_suggested_questions
 
 import base64
+import threading
 from pathlib import Path
 
+
+@st.cache_resource
+def _event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Long-lived event loop on a daemon thread, shared by every session, so the
+    async OpenAI client keeps its connection pool between reruns.
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop
+
+
+def run_async(coro):
+    """Run a coroutine on the shared event loop and block until it finishes."""
+    return asyncio.run_coroutine_threadsafe(coro, _event_loop()).result()
+
+
+def iter_async(agen):
+    """Drive an async generator on the shared event loop, yielding each item (for st.write_stream)."""
+    loop = _event_loop()
+    while True:
+        try:
+            yield asyncio.run_coroutine_threadsafe(agen.__anext__(), loop).result()
+        except StopAsyncIteration:
+            return
+
+
+class EmptyCrawlError(Exception):
+    """A crawl returned no pages (e.g. the sitemap was unreachable)."""
+
+
+@st.cache_data(ttl=3600, max_entries=32, show_spinner=False)
+def cached_crawl(sitemap: str, max_pages: int, concurrency: int, render_js: bool) -> tuple[str, list[str]]:
+    """
+    Crawl once per (sitemap, settings) and reuse the result across reruns and
+    sessions for an hour, so reloading a recently crawled site is instant.
+    Raises EmptyCrawlError when nothing was crawled: Streamlit does not cache
+    exceptions, so a transient failure is retried on the next click.
+    """
+    # Runs on the shared long-lived loop: no per-click loop/policy setup
+    context, crawled_urls = run_async(crawl_website(
+        sitemap,
+        max_pages=max_pages,
+        concurrency=concurrency,
+        render_js=render_js
+    ))
+    if not crawled_urls:
+        raise EmptyCrawlError(sitemap)
+    return context, crawled_urls
+
+
+@st.cache_data(ttl=3600, max_entries=128, show_spinner=False)
+def cached_suggested_questions(context: str) -> list[dict]:
+    """
+    Suggested questions per crawled context, reused across reruns and sessions.
+    Kept in memory with a TTL (not on disk, where Streamlit ignores ttl) so a
+    fallback answer from a failed model reply is not served indefinitely.
+    """
+    return run_async(get_suggested_questions(context))
+
+
+def rfp_time_estimate(context: str, crawled_urls: list[str]) -> str:
+    """Rough RFP analysis duration shown in the spinner (same estimate ai_service logs)."""
+    low, high = estimate_rfp_seconds(len(crawled_urls), len(context))
+    return f"~{low}-{high} seconds"
+
+
+@st.cache_resource
 def img_to_base64(relative_path: str) -> str:
     """
     Convert local image to base64 string for Streamlit HTML embedding
@@ -81,44 +153,29 @@ st.set_page_config(page_title="CMS AutomateX Team", page_icon="🤖", layout="ce
 for key, default in {
     "sitemap_url": None,
     "context": "",
+    "crawled_urls": [],
     "messages": [],
-    "suggested_questions": []
+    "suggested_questions": [],
+    "rfp_data": None,
+    "xlsx_bytes": None,
 }.items():
     if key not in st.session_state:
         st.session_state[key] = default
 
-if "rfp_data" not in st.session_state:
-    st.session_state["rfp_data"] = None
-
-if "suggested_questions" not in st.session_state:
-    st.session_state["suggested_questions"] = []
-
-if "messages" not in st.session_state:
-    st.session_state["messages"] = []
-
-if "context" not in st.session_state:
-    st.session_state["context"] = ""    
-
 # ---------------- CSS (external file) ----------------
 
-from pathlib import Path
 # Load external CSS (Tailwind + custom overrides) from assets/theme.css
-
-css_path = Path(__file__).parent / "assets" / "theme.css"
-if css_path.exists():
-    with open(css_path, "r", encoding="utf-8") as f:
-        css_content = f.read()
-    st.markdown(f"<style>{css_content}</style>", unsafe_allow_html=True)
-else:
+@st.cache_resource
+def _theme_css() -> str:
+    """Read the stylesheet once per process; it is still emitted every run, as Streamlit requires."""
+    css_path = Path(__file__).parent / "assets" / "theme.css"
+    if css_path.exists():
+        return f"<style>{css_path.read_text(encoding='utf-8')}</style>"
     # Fallback: minimal styles if assets file is missing
-    st.markdown(
-        """
-        <style>
-        .fallback-container{display:flex;justify-content:center}
-        </style>
-        """,
-        unsafe_allow_html=True,
-    )
+    return "<style>.fallback-container{display:flex;justify-content:center}</style>"
+
+
+st.markdown(_theme_css(), unsafe_allow_html=True)
 
 # ---------------- UI ----------------
 
@@ -159,79 +216,75 @@ st.markdown(
 )
 
 if not st.session_state["messages"]:
-    st.markdown(
-        '<div class="inline-block bg-gray-200 text-gray-800 p-3 rounded-lg mb-2 max-w-4/5 website-sitemap>Hello! 👋<br>Please enter a website Sitemap URL to get started.</div>',
-        unsafe_allow_html=True
-    )
+    with st.chat_message("assistant"):
+        st.markdown("Hello! 👋  \nPlease enter a website Sitemap URL to get started.")
 
+# Native chat elements: no per-message raw-HTML parsing on every rerun
 for msg in st.session_state["messages"]:
-    if msg["role"] == "user":
-        st.markdown(f'<div class="ml-auto bg-indigo-600 text-white p-3 rounded-lg mb-2 max-w-4/5">{msg["content"]}</div>', unsafe_allow_html=True)
-    else:
-        st.markdown(f'<div class="bg-gray-200 text-gray-800 p-3 rounded-lg mb-2 max-w-4/5 website-sitemap">{msg["content"]}</div>', unsafe_allow_html=True)
-st.markdown('</div>', unsafe_allow_html=True)
-
+    with st.chat_message("user" if msg["role"] == "user" else "assistant"):
+        st.markdown(msg["content"])
 
 
 # Input
-st.markdown('<div class="p-3 border-t bg-white">', unsafe_allow_html=True)
-
 if not st.session_state["sitemap_url"]:
-    # Crawl controls
-    col_a, col_b = st.columns(2)
-    with col_a:
-        ui_max_pages = st.number_input("Max pages to crawl", min_value=50, max_value=5000, value=300, step=50)
-    with col_b:
-        ui_concurrency = st.number_input("Concurrent fetches", min_value=1, max_value=24, value=8, step=1)
+    # Crawl controls live in a form so editing them doesn't rerun the script per widget
+    with st.form("sitemap_form"):
+        col_a, col_b = st.columns(2)
+        with col_a:
+            ui_max_pages = st.number_input("Max pages to crawl", min_value=50, max_value=5000, value=300, step=50)
+        with col_b:
+            ui_concurrency = st.number_input("Concurrent fetches", min_value=1, max_value=24, value=8, step=1)
 
-    render_js = st.checkbox("Render JS (Playwright)", help="Enable for SPA/JS-heavy sites. Slower but captures dynamic content.", value=False)
+        render_js = st.checkbox("Render JS (Playwright)", help="Enable for SPA/JS-heavy sites. Slower but captures dynamic content.", value=False)
 
-    sitemap = st.text_input("Sitemap URL", placeholder="https://example.com/sitemap.xml", label_visibility="collapsed")
+        sitemap = st.text_input("Sitemap URL", placeholder="https://example.com/sitemap.xml", label_visibility="collapsed")
 
-    if st.button("Load Sitemap"):
+        submitted = st.form_submit_button("Load Sitemap")
+
+    if submitted:
         if not sitemap.startswith("http"):
             st.warning("Please enter a valid sitemap URL.")
         else:
-            with st.spinner("Crawling sitemap..."):
-                context, crawled = asyncio.run(crawl_website(
-                    sitemap,
-                    max_pages=int(ui_max_pages),
-                    concurrency=int(ui_concurrency),
-                    render_js=bool(render_js)
-                ))
-                st.session_state["context"] = context
-                st.session_state["crawled_urls"] = crawled
-                st.session_state["sitemap_url"] = sitemap
-                if not st.session_state["suggested_questions"]:
-                    st.session_state["suggested_questions"] = get_suggested_questions(context)
-
-            st.session_state["messages"].append({
-                "role": "bot",
-                "content": (
-                             "Nice! 👍 Sitemap indexed successfully.\n\n"
-                                f"**Sitemap:** [{sitemap}]({sitemap})\n\n"
-                            "Ask me anything about it."
-                            )
-                        })
-            if crawled:
+            try:
+                with st.spinner("Crawling sitemap..."):
+                    context, crawled = cached_crawl(
+                        sitemap.strip(),
+                        int(ui_max_pages),
+                        int(ui_concurrency),
+                        bool(render_js)
+                    )
+                    st.session_state["context"] = context
+                    st.session_state["crawled_urls"] = crawled
+                    st.session_state["sitemap_url"] = sitemap
+                    if not st.session_state["suggested_questions"]:
+                        st.session_state["suggested_questions"] = cached_suggested_questions(context)
+            except EmptyCrawlError:
+                st.error("❌ No pages could be crawled from this sitemap. Please check the URL and try again.")
+            else:
+                st.session_state["messages"].append({
+                    "role": "bot",
+                    "content": (
+                                 "Nice! 👍 Sitemap indexed successfully.\n\n"
+                                    f"**Sitemap:** [{sitemap}]({sitemap})\n\n"
+                                "Ask me anything about it."
+                                )
+                            })
                 st.session_state["messages"].append({
                     "role": "bot",
                     "content": f"Indexed representative URLs (showing up to 20 of {len(crawled)}):\n\n" + "\n".join(crawled[:20])
                 })
-            st.rerun()
+                st.rerun()
 else:
-    with st.form("chat_form", clear_on_submit=True):
-        user_input = st.text_input("Reply...", label_visibility="collapsed")
-        send = st.form_submit_button("Send")
-
-    if send and user_input.strip():
+    if user_input := st.chat_input("Reply..."):
         st.session_state["messages"].append({
             "role": "user",
             "content": user_input
         })
 
-        with st.spinner("Thinking..."):
-            answer = ask_ai(user_input, st.session_state["context"])
+        with st.chat_message("user"):
+            st.markdown(user_input)
+        with st.chat_message("assistant"):
+            answer = st.write_stream(iter_async(ask_ai(user_input, st.session_state["context"])))
 
         st.session_state["messages"].append({
             "role": "bot",
@@ -240,10 +293,6 @@ else:
 
         st.rerun()
 
-
-st.markdown('</div>', unsafe_allow_html=True)
-st.markdown('</div>', unsafe_allow_html=True)
-
 # ---------------- Auto-suggested questions UI ----------------
 if st.session_state["suggested_questions"]:
     st.markdown("### Suggested Questions")
@@ -257,11 +306,11 @@ if st.session_state["suggested_questions"]:
                 "content": q["ui_label"]
             })
 
-            with st.spinner("Thinking..."):
-                answer = ask_ai(
+            with st.chat_message("assistant"):
+                answer = st.write_stream(iter_async(ask_ai(
                     q["ai_prompt"],
                     st.session_state["context"]
-                )
+                )))
 
             st.session_state["messages"].append({
                 "role": "bot",
@@ -270,8 +319,81 @@ if st.session_state["suggested_questions"]:
 
             st.rerun()
 
+def _write_sheet(wb, name: str, rows: list[dict], header_fmt) -> None:
+    """Write a list of dicts as one sheet, row by row (columns in first-seen key order)."""
+    headers = list(dict.fromkeys(k for row in rows for k in row))
+    ws = wb.add_worksheet(name)
+    ws.write_row(0, 0, headers, header_fmt)
+    for r, row in enumerate(rows, start=1):
+        values = [row.get(k) for k in headers]
+        ws.write_row(r, 0, [v if v is None or isinstance(v, (str, int, float)) else str(v) for v in values])
+
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def generate_excel(rfp_data: dict) -> bytes:
+    """Build the RFP workbook; memoized on rfp_data so chat reruns don't rebuild it."""
+    output = BytesIO()
+
+    # Rows are streamed straight from the RFP dicts; no DataFrames in between.
+    # constant_memory writes each finished row straight out as sheet XML (no per-cell
+    # objects); in_memory is left off because it would silently disable that mode.
+    wb = xlsxwriter.Workbook(output, {"constant_memory": True})
+    header_fmt = wb.add_format({"bold": True, "border": 1, "align": "center"})
+
+    # ---------------- Overview ----------------
+    _write_sheet(wb, "Overview", [rfp_data.get("overview", {}) or {}], header_fmt)
+
+    # ---------------- Page Types ----------------
+    page_types = rfp_data.get("page_types", []) or []
+    if page_types:
+        # Derive per-page-type component list and add as 'component' and 'components_reusable' columns
+        pt_to_components: dict[str, set] = {}
+        for p in rfp_data.get("pages", []) or []:
+            pt = (p.get("page_type") or "").strip()
+            comps = [c.strip() for c in (p.get("components", []) or []) if isinstance(c, str) and c.strip()]
+            if not pt:
+                continue
+            if pt not in pt_to_components:
+                pt_to_components[pt] = set()
+            pt_to_components[pt].update(comps)
+
+        # Compute reuse across page types
+        comp_to_pts: dict[str, set] = {}
+        for pt_name, comps in pt_to_components.items():
+            for c in comps:
+                comp_to_pts.setdefault(c, set()).add(pt_name)
+        reusable_set = {c for c, pts in comp_to_pts.items() if len(pts) > 1}
+
+        rows = []
+        for pt_obj in page_types:
+            name = pt_obj.get("name")
+            comps = pt_to_components.get(name, set()) if isinstance(name, str) and name else set()
+            rows.append({
+                **pt_obj,
+                "component": ", ".join(sorted(comps)),
+                "components_reusable": ", ".join(sorted(comps & reusable_set)),
+            })
+        _write_sheet(wb, "Page Types", rows, header_fmt)
+
+    # ---------------- Remaining flat sections (skipped when empty) ----------------
+    sections = (
+        ("Components", rfp_data.get("components", [])),
+        ("Pages", rfp_data.get("pages", [])),
+        ("Third Party Integrations", rfp_data.get("third_party_integrations", [])),
+        ("Recommendations", [{"Recommendation": r} for r in rfp_data.get("recommendations", []) or []]),
+    )
+    for sheet_name, rows in sections:
+        if rows:
+            _write_sheet(wb, sheet_name, rows, header_fmt)
+
+    wb.close()
+    return output.getvalue()
+
+
 # ---------------- RFP Analysis & Download Excel----------------
-if st.session_state["sitemap_url"]:
+@st.fragment
+def rfp_section():
+    """Generate/download controls; their clicks rerun only this fragment, not the whole page."""
     if st.button("📊 Generate RFP Analysis"):
         crawled_count = len(st.session_state.get("crawled_urls", []))
         
@@ -280,122 +402,36 @@ if st.session_state["sitemap_url"]:
             st.error("❌ No context available. Please crawl a sitemap first.")
         elif crawled_count == 0:
             st.error("❌ No URLs found. Please ensure the sitemap crawl was successful and returned pages.")
-        # Show estimated time based on URL count
-        elif crawled_count <= 100:
-            time_est = "~15-30 seconds"
-        elif crawled_count <= 500:
-            time_est = f"~{int(crawled_count/100) * 20} seconds - {int(crawled_count/100) * 40} seconds"
         else:
-            time_est = f"~{int(crawled_count/80) * 20} seconds - {int(crawled_count/80) * 40} seconds"
-        
-        with st.spinner(f"Generating RFP analysis for {crawled_count} pages (est. {time_est})..."):
-            from ai_service import generate_rfp_analysis
-            # Automatic batch sizing based on URL count for optimal performance
-            st.session_state["rfp_data"] = generate_rfp_analysis(
-                st.session_state["context"],
-                st.session_state.get("crawled_urls", []),
-                batch_size=None  # Auto-adjust: 100 for <500, 80 for <1000, 50 for >1000
-            )
-        
-        final_count = len(st.session_state["rfp_data"].get("pages", []))
-        st.success(f"✅ RFP analysis complete! Analyzed {final_count} pages.")
-        st.rerun()
-
-def generate_excel(rfp_data: dict):
-    output = BytesIO()
-
-    with pd.ExcelWriter(output, engine="openpyxl") as writer:
-
-        # ---------------- Overview ----------------
-        pd.DataFrame([rfp_data.get("overview", {})]).to_excel(
-            writer, sheet_name="Overview", index=False
-        )
-
-        # ---------------- Page Types ----------------
-        page_types = pd.DataFrame(rfp_data.get("page_types", []))
-        if not page_types.empty:
-            # Derive per-page-type component list and add as 'component' and 'components_reusable' columns
-            try:
-                pt_to_components: dict[str, set] = {}
-                for p in rfp_data.get("pages", []) or []:
-                    pt = (p.get("page_type") or "").strip()
-                    comps = [c.strip() for c in (p.get("components", []) or []) if isinstance(c, str) and c.strip()]
-                    if not pt:
-                        continue
-                    if pt not in pt_to_components:
-                        pt_to_components[pt] = set()
-                    pt_to_components[pt].update(comps)
-
-                # Compute reuse across page types
-                comp_to_pts: dict[str, set] = {}
-                for pt_name, comps in pt_to_components.items():
-                    for c in comps:
-                        comp_to_pts.setdefault(c, set()).add(pt_name)
-                reusable_set = {c for c, pts in comp_to_pts.items() if len(pts) > 1}
-
-                def _components_for_pt(name: str) -> str:
-                    if not isinstance(name, str) or not name:
-                        return ""
-                    comps = sorted(pt_to_components.get(name, set()))
-                    return ", ".join(comps)
-
-                def _components_reusable_for_pt(name: str) -> str:
-                    if not isinstance(name, str) or not name:
-                        return ""
-                    comps = sorted(pt_to_components.get(name, set()) & reusable_set)
-                    return ", ".join(comps)
-
-                page_types = page_types.copy()
-                page_types["component"] = page_types.get("name").apply(_components_for_pt)
-                page_types["components_reusable"] = page_types.get("name").apply(_components_reusable_for_pt)
-            except Exception:
-                # If anything fails, still export the base page types
-                pass
-
-            page_types.to_excel(writer, sheet_name="Page Types", index=False)
-
-        # ---------------- Components ----------------
-        components = pd.DataFrame(rfp_data.get("components", []))
-        if not components.empty:
-            components.to_excel(writer, sheet_name="Components", index=False)
-
-        # ---------------- Pages ----------------
-        pages = pd.DataFrame(rfp_data.get("pages", []))
-        if not pages.empty:
-            pages.to_excel(writer, sheet_name="Pages", index=False)
-
-        # ---------------- Third-party Integrations ----------------
-        integrations = pd.DataFrame(
-            rfp_data.get("third_party_integrations", [])
-        )
-        if not integrations.empty:
-            integrations.to_excel(
-                writer, sheet_name="Third Party Integrations", index=False
-            )
-
-        # ---------------- Recommendations ----------------
-        recommendations = pd.DataFrame(
-            rfp_data.get("recommendations", []),
-            columns=["Recommendation"]
-        )
-        if not recommendations.empty:
-            recommendations.to_excel(
-                writer, sheet_name="Recommendations", index=False
+            time_est = rfp_time_estimate(st.session_state["context"], st.session_state["crawled_urls"])
+            with st.spinner(f"Generating RFP analysis for {crawled_count} pages (est. {time_est})..."):
+                from ai_service import generate_rfp_analysis
+                # Automatic batch sizing based on URL count for optimal performance
+                st.session_state["rfp_data"] = run_async(generate_rfp_analysis(
+                    st.session_state["context"],
+                    st.session_state.get("crawled_urls", []),
+                    batch_size=None  # Auto-adjust: 100 for <500, 80 for <1000, 50 for >1000
+                ))
+                st.session_state["xlsx_bytes"] = None  # stale once the analysis changes
+
+            final_count = len(st.session_state["rfp_data"].get("pages", []))
+            st.success(f"✅ RFP analysis complete! Analyzed {final_count} pages.")
+            st.rerun(scope="fragment")
+
+    if st.session_state.get("rfp_data"):
+        # Build the workbook only once the user asks for it
+        if st.session_state["xlsx_bytes"] is None:
+            if st.button("📄 Prepare Excel download"):
+                st.session_state["xlsx_bytes"] = generate_excel(st.session_state["rfp_data"])
+                st.rerun(scope="fragment")
+        else:
+            st.download_button(
+                label="📥 Download RFP Analysis (Excel)",
+                data=st.session_state["xlsx_bytes"],
+                file_name="Website_RFP_Analysis.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
             )
 
-    output.seek(0)
-    return output
-     
-
-if st.session_state.get("rfp_data"):
-    excel_file = generate_excel(st.session_state["rfp_data"])
-
-    st.download_button(
-        label="📥 Download RFP Analysis (Excel)",
-        data=excel_file,
-        file_name="Website_RFP_Analysis.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
-
-
 
+if st.session_state["sitemap_url"]:
+    rfp_section()
@@ -2,8 +2,13 @@ from playwright.async_api import async_playwright
 from bs4 import BeautifulSoup
 from urllib.parse import urlparse, urljoin
 import re
+import gzip
+import asyncio
 import logging
 import aiohttp
+from functools import lru_cache
+from io import BytesIO
+from lxml import etree, html as lxml_html
 
 # Basic logger for visibility in console/Streamlit logs
 logger = logging.getLogger("cmsautomatex.crawler")
@@ -15,6 +20,183 @@ if not logger.handlers:
 logger.setLevel(logging.INFO)
 
 
+# One headless Chromium per process, reused across crawls (launching costs seconds)
+_playwright = None
+_browser = None
+_browser_loop: asyncio.AbstractEventLoop | None = None
+_browser_lock: asyncio.Lock | None = None
+
+
+async def _close_browser(playwright, browser) -> None:
+    """Closes a browser and stops its Playwright driver."""
+    try:
+        if browser is not None:
+            await browser.close()
+    finally:
+        if playwright is not None:
+            await playwright.stop()
+
+
+def _log_close_failure(fut) -> None:
+    if not fut.cancelled() and fut.exception() is not None:
+        logger.warning("Closing resources on the previous event loop failed: %s", fut.exception())
+
+
+def _close_on_loop(coro, loop: asyncio.AbstractEventLoop) -> None:
+    """
+    Best-effort cleanup of a resource bound to another event loop: the coroutine
+    is scheduled on that loop if it is still running, otherwise it is dropped.
+    """
+    if loop.is_running():
+        asyncio.run_coroutine_threadsafe(coro, loop).add_done_callback(_log_close_failure)
+    else:
+        coro.close()
+        logger.debug("Previous event loop is no longer running; its resources could not be closed")
+
+
+async def _get_browser():
+    """
+    Returns the shared browser, launching it on first use or if it died.
+    The browser is bound to the event loop that launched it, so a crawl on a
+    different loop gets a fresh one (the old browser and driver are closed on
+    their own loop where possible).
+    """
+    global _playwright, _browser, _browser_loop, _browser_lock
+    loop = asyncio.get_running_loop()
+    if _browser_loop is not loop:
+        if _browser_loop is not None and (_playwright is not None or _browser is not None):
+            _close_on_loop(_close_browser(_playwright, _browser), _browser_loop)
+        _playwright = _browser = None
+        _browser_loop, _browser_lock = loop, asyncio.Lock()
+    async with _browser_lock:
+        if _browser is None or not _browser.is_connected():
+            if _playwright is None:
+                _playwright = await async_playwright().start()
+            _browser = await _playwright.chromium.launch(headless=True, args=["--no-sandbox", "--disable-dev-shm-usage"])
+            logger.info("Launched shared Chromium instance")
+        return _browser
+
+
+# Shared aiohttp session for static fetches, so keep-alive connections and the
+# DNS cache survive across crawls; like the browser, it is bound to one loop
+_http_session: aiohttp.ClientSession | None = None
+_http_loop: asyncio.AbstractEventLoop | None = None
+
+
+def _get_http_session() -> aiohttp.ClientSession:
+    global _http_session, _http_loop
+    loop = asyncio.get_running_loop()
+    if _http_session is None or _http_session.closed or _http_loop is not loop:
+        if _http_session is not None and not _http_session.closed and _http_loop is not None:
+            _close_on_loop(_http_session.close(), _http_loop)
+        _http_session = aiohttp.ClientSession(
+            headers={
+                "User-Agent": "CMSAutomateXCrawler/1.0",
+                "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.8"
+            },
+            # Overall pool cap; per-crawl concurrency is enforced by the crawl's semaphore
+            connector=aiohttp.TCPConnector(limit=64, limit_per_host=24, ttl_dns_cache=300, keepalive_timeout=30),
+            timeout=aiohttp.ClientTimeout(total=30, sock_connect=10),
+        )
+        _http_loop = loop
+    return _http_session
+
+
+# Resource types that never contribute to extracted page text
+_BLOCKED_RESOURCE_TYPES = frozenset({"image", "font", "media", "stylesheet", "websocket"})
+
+
+async def _block_heavy_resources(route):
+    if route.request.resource_type in _BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+async def _new_light_context(browser):
+    """Browser context that skips images/fonts/media/CSS for text-only rendering."""
+    ctx = await browser.new_context()
+    try:
+        await ctx.route("**/*", _block_heavy_resources)
+    except Exception:
+        pass
+    return ctx
+
+
+# scheme://<netloc>/... ; same netloc as urlparse() gives for absolute URLs
+_NETLOC_RE = re.compile(r"[A-Za-z][A-Za-z0-9+.\-]*://([^/?#]*)")
+
+
+def _netloc(url: str) -> str:
+    """Cheap netloc extraction for hot loops (no full urlparse)."""
+    m = _NETLOC_RE.match(url)
+    return m.group(1) if m else ""
+
+
+# Path-segment classifier for _normalize_pattern: one match decides UUID, date
+# (YYYY-MM or YYYY-MM-DD) or mixed alphanumeric id (8+ chars with a letter and a digit);
+# the group name is the placeholder
+_SEGMENT_CLASS_RE = re.compile(
+    r"(?P<uuid>[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12})"
+    r"|(?P<date>\d{4}-\d{2}(?:-\d{2})?)"
+    r"|(?P<alphaid>(?=[a-zA-Z]*[0-9])(?=[0-9]*[a-zA-Z])[a-zA-Z0-9]{8,})"
+)
+
+
+# Last-segment names that denote a fixed page rather than a content slug
+_STATIC_PAGES = frozenset({
+    "about", "contact", "services", "products", "blog", "news",
+    "team", "pricing", "faq", "help", "support", "careers", "index",
+    "home", "portfolio", "gallery", "events",
+})
+
+
+@lru_cache(maxsize=8192)
+def _classify_segment(s: str, is_last: bool) -> str:
+    """
+    Placeholder (or lowercased literal) for one path segment. Sitemaps repeat the
+    same segment strings heavily, so results are memoized.
+    """
+    # Pure numeric ID
+    if s.isdigit():
+        return ":id"
+    # UUID, date or alphanumeric ID (e.g. abc12345), classified in a single match.
+    # All-digit years/months/days are already caught as :id above.
+    elif m := _SEGMENT_CLASS_RE.fullmatch(s):
+        return ":" + m.lastgroup
+    # Hyphens/underscores: distinguish between category names and content slugs
+    elif "-" in s or "_" in s:
+        # If last segment or very long (>30 chars), it's likely a content slug
+        if is_last and len(s) > 15:
+            return ":slug"
+        # Short hyphenated segments not at end could be category names - keep them
+        elif not is_last and len(s) <= 25:
+            return s.lower()
+        # Last segment, medium length - could be slug or short identifier
+        elif is_last:
+            return ":slug"
+        else:
+            return s.lower()
+    # Very long segments - likely slugs
+    elif len(s) > 30:
+        return ":slug"
+    # Short alphanumeric segments not at end - preserve as category names
+    elif not is_last and len(s) <= 20 and s.isalnum():
+        return s.lower()
+    # Last segment that's short alphanumeric
+    elif is_last and len(s) <= 20 and s.isalnum():
+        # Known static pages - keep as-is
+        if s.lower() in _STATIC_PAGES:
+            return s.lower()
+        # Otherwise treat as dynamic slug
+        else:
+            return ":slug"
+    # Default: preserve segment
+    else:
+        return s.lower()
+
+
+@lru_cache(maxsize=65536)
 def _normalize_pattern(url: str, base_netloc: str) -> str:
     """
     Normalize URL path to derive a page-type pattern by replacing dynamic
@@ -22,7 +204,6 @@ def _normalize_pattern(url: str, base_netloc: str) -> str:
     Preserves actual category names to distinguish different page types.
     Different categories = different groups, same depth subcategories = same group only if under same parent.
     """
-    uuid_re = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")
     parsed = urlparse(url)
 
     if parsed.netloc != base_netloc:
@@ -34,70 +215,8 @@ def _normalize_pattern(url: str, base_netloc: str) -> str:
     if not segments:
         return "/"
 
-    norm = []
-    for i, s in enumerate(segments):
-        is_last = (i == len(segments) - 1)
-        
-        # Pure numeric ID
-        if s.isdigit():
-            norm.append(":id")
-        # UUID format
-        elif uuid_re.match(s):
-            norm.append(":uuid")
-        # Year (4 digits)
-        elif re.match(r"^\d{4}$", s):
-            norm.append(":year")
-        # Date formats: YYYY-MM-DD, YYYY-MM
-        elif re.match(r"^\d{4}-\d{2}(-\d{2})?$", s):
-            norm.append(":date")
-        # Month/day (01-12 or 01-31)
-        elif re.match(r"^\d{2}$", s):
-            try:
-                num = int(s)
-                if 1 <= num <= 12:
-                    norm.append(":month")
-                elif 13 <= num <= 31:
-                    norm.append(":day")
-                else:
-                    norm.append(":id")
-            except:
-                norm.append(":id")
-        # Alphanumeric IDs (e.g., abc123, p12345) - 8+ chars with mixed alpha/digit
-        elif re.match(r"^[a-zA-Z0-9]{8,}$", s) and any(c.isdigit() for c in s) and any(c.isalpha() for c in s):
-            norm.append(":alphaid")
-        # Hyphens/underscores: distinguish between category names and content slugs
-        elif "-" in s or "_" in s:
-            # If last segment or very long (>30 chars), it's likely a content slug
-            if is_last and len(s) > 15:
-                norm.append(":slug")
-            # Short hyphenated segments not at end could be category names - keep them
-            elif not is_last and len(s) <= 25:
-                norm.append(s.lower())
-            # Last segment, medium length - could be slug or short identifier
-            elif is_last:
-                norm.append(":slug")
-            else:
-                norm.append(s.lower())
-        # Very long segments - likely slugs
-        elif len(s) > 30:
-            norm.append(":slug")
-        # Short alphanumeric segments not at end - preserve as category names
-        elif not is_last and len(s) <= 20 and s.isalnum():
-            norm.append(s.lower())
-        # Last segment that's short alphanumeric
-        elif is_last and len(s) <= 20 and s.isalnum():
-            # Known static pages - keep as-is
-            static_pages = {"about", "contact", "services", "products", "blog", "news", 
-                          "team", "pricing", "faq", "help", "support", "careers", "index",
-                          "home", "portfolio", "gallery", "events"}
-            if s.lower() in static_pages:
-                norm.append(s.lower())
-            # Otherwise treat as dynamic slug
-            else:
-                norm.append(":slug")
-        # Default: preserve segment
-        else:
-            norm.append(s.lower())
+    last = len(segments) - 1
+    norm = [_classify_segment(s, i == last) for i, s in enumerate(segments)]
 
     pattern = "/" + "/".join(norm)
     
@@ -107,6 +226,47 @@ def _normalize_pattern(url: str, base_netloc: str) -> str:
     return pattern
 
 
+# Upper bound on the combined context returned by crawl_website
+_MAX_CONTEXT_CHARS = 20000
+
+# Only the first ~6000 chars of text are kept per page, so stop downloading early
+_MAX_PAGE_BYTES = 512 * 1024
+
+
+async def _read_capped(resp: aiohttp.ClientResponse, limit: int = _MAX_PAGE_BYTES) -> str:
+    """Read at most `limit` body bytes and decode them (lenient)."""
+    body = bytearray()
+    async for chunk in resp.content.iter_chunked(65536):
+        body += chunk
+        if len(body) >= limit:
+            break
+    try:
+        return body[:limit].decode(resp.charset or "utf-8", errors="ignore")
+    except LookupError:
+        return body[:limit].decode("utf-8", errors="ignore")
+
+
+def _page_text(html: str) -> str:
+    """
+    Visible page text, whitespace-joined like BeautifulSoup's get_text(" ", strip=True),
+    but extracted straight from lxml's C tree instead of a Python-level soup walk.
+    """
+    try:
+        root = lxml_html.document_fromstring(html)
+    except (etree.ParserError, ValueError):
+        # e.g. an XML encoding declaration inside a str, or an empty document
+        return BeautifulSoup(html, "lxml").get_text(" ", strip=True)
+    etree.strip_elements(root, "script", "style", "template", etree.Comment, etree.ProcessingInstruction, with_tail=False)
+    return " ".join(t for t in (s.strip() for s in root.itertext()) if t)
+
+
+# Common SPA root/bootstrap markers, matched in a single scan of the HTML
+_SPA_MARKERS_RE = re.compile("|".join(map(re.escape, [
+    'id="root"', 'id="app"', 'data-reactroot', '__NEXT_DATA__',
+    'window.__INITIAL', 'ng-app', 'id="__nuxt"', 'data-v-app'
+])))
+
+
 def _looks_like_spa(html: str, text_len: int) -> bool:
     """
     Heuristics to detect client-rendered pages that likely need JS execution:
@@ -115,11 +275,7 @@ def _looks_like_spa(html: str, text_len: int) -> bool:
     - Script-heavy markup with minimal visible text
     """
     if text_len < 300:
-        markers = [
-            'id="root"', 'id="app"', 'data-reactroot', '__NEXT_DATA__',
-            'window.__INITIAL', 'ng-app', 'id="__nuxt"', 'data-v-app'
-        ]
-        if any(m in html for m in markers):
+        if _SPA_MARKERS_RE.search(html):
             return True
         # count scripts
         script_count = html.count('<script')
@@ -128,7 +284,18 @@ def _looks_like_spa(html: str, text_len: int) -> bool:
     return False
 
 
-async def _discover_sitemap_urls(page, base_url: str) -> list[str]:
+async def _fetch_bytes(session: aiohttp.ClientSession, url: str, timeout: float = 30) -> bytes | None:
+    """GET a URL and return the raw body, or None on any error/non-200."""
+    try:
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+            if resp.status != 200:
+                return None
+            return await resp.read()
+    except Exception:
+        return None
+
+
+async def _discover_sitemap_urls(session: aiohttp.ClientSession, base_url: str) -> list[str]:
     """
     Discover sitemap URLs via robots.txt and common locations.
     """
@@ -143,18 +310,13 @@ async def _discover_sitemap_urls(page, base_url: str) -> list[str]:
     sitemap_urls = set()
 
     # robots.txt
-    try:
-        resp = await page.goto(candidates[0], timeout=30000)
-        if resp and resp.ok:
-            content = await page.content()
-            text = BeautifulSoup(content, "html.parser").get_text("\n")
-            for line in text.splitlines():
-                if line.lower().startswith("sitemap:"):
-                    sm = line.split(":", 1)[1].strip()
-                    if sm.startswith("http"):
-                        sitemap_urls.add(sm)
-    except Exception:
-        pass
+    body = await _fetch_bytes(session, candidates[0])
+    if body:
+        for line in body.decode("utf-8", errors="ignore").splitlines():
+            if line.lower().startswith("sitemap:"):
+                sm = line.split(":", 1)[1].strip()
+                if sm.startswith("http"):
+                    sitemap_urls.add(sm)
 
     # Common paths
     sitemap_urls.add(candidates[1])
@@ -163,86 +325,120 @@ async def _discover_sitemap_urls(page, base_url: str) -> list[str]:
     return list(sitemap_urls)
 
 
-async def _extract_urls_from_sitemap(page, sitemap_url: str) -> list[str]:
+def _local_name(tag) -> str:
+    return tag.rsplit("}", 1)[-1] if isinstance(tag, str) else ""
+
+
+async def _extract_urls_from_sitemap(session: aiohttp.ClientSession, sitemap_url: str, sem: asyncio.Semaphore | None = None) -> list[str]:
     """
-    Extract <loc> URLs from a sitemap or sitemap index.
+    Extract <loc> URLs from a sitemap or sitemap index (plain or gzipped XML).
+    Fetched over plain HTTP and parsed incrementally; no browser involved.
+    Child sitemaps of an index are fetched concurrently (bounded by sem).
     """
+    if sem is None:
+        sem = asyncio.Semaphore(16)
     urls: list[str] = []
-    try:
-        resp = await page.goto(sitemap_url, timeout=30000)
-        if not resp or not resp.ok:
-            return urls
-        xml = await page.content()
-        soup = BeautifulSoup(xml, "xml")
-
-        index = soup.find_all("sitemap")
-        if index:
-            for sm in index:
-                loc = sm.find("loc")
-                if loc and loc.text:
-                    urls.extend(await _extract_urls_from_sitemap(page, loc.text.strip()))
+    async with sem:
+        data = await _fetch_bytes(session, sitemap_url)
+    if not data:
+        return urls
+    if data[:2] == b"\x1f\x8b":
+        try:
+            data = gzip.decompress(data)
+        except Exception:
             return urls
 
-        for u in soup.find_all("url"):
-            loc = u.find("loc")
-            if loc and loc.text:
-                urls.append(loc.text.strip())
-
-        if not urls:
-            for loc in soup.find_all("loc"):
-                if loc and loc.text:
-                    urls.append(loc.text.strip())
+    child_sitemaps: list[str] = []
+    other_locs: list[str] = []
+    try:
+        for _, el in etree.iterparse(BytesIO(data), events=("end",), recover=True):
+            name = _local_name(el.tag)
+            if name == "loc":
+                loc = (el.text or "").strip()
+                if loc:
+                    parent = _local_name(el.getparent().tag) if el.getparent() is not None else ""
+                    if parent == "sitemap":
+                        child_sitemaps.append(loc)
+                    elif parent == "url":
+                        urls.append(loc)
+                    else:
+                        other_locs.append(loc)
+            elif name in ("url", "sitemap"):
+                # Free finished entries so large sitemaps parse in flat memory
+                el.clear()
+                while el.getprevious() is not None:
+                    del el.getparent()[0]
     except Exception:
+        pass
+
+    if child_sitemaps:
+        # gather keeps the children's order, so the URL list matches a sequential walk
+        for child_urls in await asyncio.gather(*(_extract_urls_from_sitemap(session, sm, sem) for sm in child_sitemaps)):
+            urls.extend(child_urls)
         return urls
 
-    return urls
+    return urls or other_locs
 
 
-async def _representative_urls_from_sitemaps(page, base_url: str, max_types: int = 100) -> list[str]:
+async def _representative_urls_from_sitemaps(session: aiohttp.ClientSession, base_url: str, max_types: int = 100) -> list[str]:
     """
     Build representative URLs for unique page types from discovered sitemaps.
     """
     parsed = urlparse(base_url)
     netloc = parsed.netloc
     patterns_to_url: dict[str, str] = {}
-
-    for sm_url in await _discover_sitemap_urls(page, base_url):
-        for u in await _extract_urls_from_sitemap(page, sm_url):
-            if urlparse(u).netloc != netloc:
-                continue
-            pattern = _normalize_pattern(u, netloc)
-            if not pattern:
-                continue
-            if pattern not in patterns_to_url:
+    # sitemap.xml and sitemap_index.xml often list the same URLs; skip repeats outright
+    seen_urls: set[str] = set()
+
+    # Fetch all discovered sitemaps concurrently, but consume them in discovery order
+    # so the chosen representatives stay deterministic; stop (and cancel the rest)
+    # as soon as enough page types are found
+    sem = asyncio.Semaphore(16)
+    tasks = [
+        asyncio.ensure_future(_extract_urls_from_sitemap(session, sm_url, sem))
+        for sm_url in await _discover_sitemap_urls(session, base_url)
+    ]
+    try:
+        for task in tasks:
+            for u in await task:
+                if u in seen_urls:
+                    continue
+                seen_urls.add(u)
+                # Off-site URLs normalise to "" (netloc is checked inside, and cached)
+                pattern = _normalize_pattern(u, netloc)
+                if not pattern or pattern in patterns_to_url:
+                    continue
                 patterns_to_url[pattern] = u
                 if len(patterns_to_url) >= max_types:
                     break
-        if len(patterns_to_url) >= max_types:
-            break
+            if len(patterns_to_url) >= max_types:
+                break
+    finally:
+        for task in tasks:
+            task.cancel()
 
     return list(patterns_to_url.values())
 
-async def _representative_urls_from_given_sitemap(page, sitemap_url: str, max_types: int = 30) -> list[str]:
+async def _representative_urls_from_given_sitemap(session: aiohttp.ClientSession, sitemap_url: str, max_types: int = 30) -> list[str]:
     """
     Build representative URLs for unique page types from a provided sitemap URL.
     """
-    urls = await _extract_urls_from_sitemap(page, sitemap_url)
+    urls = await _extract_urls_from_sitemap(session, sitemap_url)
     netloc = urlparse(sitemap_url).netloc
     if not netloc and urls:
         netloc = urlparse(urls[0]).netloc
 
     patterns_to_url: dict[str, str] = {}
     for u in urls:
-        parsed = urlparse(u)
-        if netloc and parsed.netloc != netloc:
+        u_netloc = _netloc(u)
+        if netloc and u_netloc != netloc:
             continue
-        pattern = _normalize_pattern(u, netloc or parsed.netloc)
-        if not pattern:
+        pattern = _normalize_pattern(u, netloc or u_netloc)
+        if not pattern or pattern in patterns_to_url:
             continue
-        if pattern not in patterns_to_url:
-            patterns_to_url[pattern] = u
-            if len(patterns_to_url) >= max_types:
-                break
+        patterns_to_url[pattern] = u
+        if len(patterns_to_url) >= max_types:
+            break
 
     return list(patterns_to_url.values())
 
@@ -251,23 +447,34 @@ async def crawl_website(url: str, max_pages: int = 300, concurrency: int = 8, re
     """
     Crawls a website and returns extracted text content.
     Groups page types via sitemap.xml and crawls one representative URL per type.
+    Returns (context, crawled_urls): the context holds "[URL]"-marked text for as
+    many pages as fit in _MAX_CONTEXT_CHARS, while crawled_urls lists every page
+    fetched, including those whose text did not fit.
     Safe for Streamlit + Windows.
     """
     collected_text: list[str] = []
     crawled_urls: list[str] = []
     visited = set()
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True,args=["--no-sandbox", "--disable-dev-shm-usage"])
-        page = await browser.new_page()
+    # Reuse the process-wide browser; each crawl only gets its own context, created
+    # on the first page that needs rendering (static crawls never start Chromium)
+    main_ctx = None
+    ctx_lock = asyncio.Lock()
 
-        await page.goto(url, timeout=60000)
+    async def _context():
+        nonlocal main_ctx
+        async with ctx_lock:
+            if main_ctx is None:
+                main_ctx = await _new_light_context(await _get_browser())
+        return main_ctx
 
-        # Prefer sitemap-driven representative URLs
+    try:
+        # Prefer sitemap-driven representative URLs (sitemaps are fetched over plain HTTP)
+        http = _get_http_session()
         if url.lower().endswith(".xml") or "sitemap" in url.lower():
-            representative_links = await _representative_urls_from_given_sitemap(page, url, max_types=max_pages)
+            representative_links = await _representative_urls_from_given_sitemap(http, url, max_types=max_pages)
         else:
-            representative_links = await _representative_urls_from_sitemaps(page, url, max_types=max_pages)
+            representative_links = await _representative_urls_from_sitemaps(http, url, max_types=max_pages)
 
         if representative_links:
             logger.info("Representative URLs discovered (%d):\n%s", len(representative_links), "\n".join(representative_links))
@@ -278,31 +485,59 @@ async def crawl_website(url: str, max_pages: int = 300, concurrency: int = 8, re
             links_to_crawl = representative_links[:max_pages]
             logger.info("Selected URLs to crawl (%d):\n%s", len(links_to_crawl), "\n".join(links_to_crawl))
         else:
-            # Fallback: original anchor-based approach
+            # Fallback: original anchor-based approach (only this path needs the browser page)
+            page = await (await _context()).new_page()
+            await page.goto(url, timeout=60000)
             links = await page.eval_on_selector_all(
                 "a[href]",
                 "els => els.map(e => e.href)"
             )
             base_netloc = urlparse(url).netloc
-            links_to_crawl = [
-                l for l in links if urlparse(l).netloc == base_netloc and l.startswith(url)
-            ][:max_pages]
+            # Filter and dedupe first (fragments point at the same page), then cap
+            seen_links: set[str] = set()
+            for l in links:
+                l = l.partition("#")[0]
+                if l in seen_links or not l.startswith(url) or _netloc(l) != base_netloc:
+                    continue
+                seen_links.add(l)
+                links_to_crawl.append(l)
+                if len(links_to_crawl) >= max_pages:
+                    break
             if links_to_crawl:
                 logger.info("Fallback to anchor-based selection. URLs to crawl (%d):\n%s", len(links_to_crawl), "\n".join(links_to_crawl))
 
         # Fetch pages with limited concurrency to speed up crawling
-        import asyncio
-        from time import perf_counter
+        from time import monotonic, perf_counter
 
         sem = asyncio.Semaphore(concurrency)  # configurable concurrency limit
 
-        # Optional aiohttp session if not rendering JS
-        aio_sess: aiohttp.ClientSession | None = None
-        if not render_js:
-            aio_sess = aiohttp.ClientSession(headers={
-                "User-Agent": "CMSAutomateXCrawler/1.0",
-                "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.8"
-            })
+        # Pace request starts (the crawl targets one host) so the initial burst
+        # doesn't trip rate limits: at most 2 x concurrency starts per second
+        start_interval = 1.0 / (concurrency * 2)
+        next_start = 0.0
+        pace_lock = asyncio.Lock()
+
+        async def _wait_turn() -> None:
+            nonlocal next_start
+            async with pace_lock:
+                now = monotonic()
+                delay = next_start - now
+                next_start = max(now, next_start) + start_interval
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        # Shared aiohttp session if not rendering JS
+        aio_sess: aiohttp.ClientSession | None = None if render_js else http
+
+        async def render(url_to_render: str) -> str:
+            # One page per fetch in the crawl's shared (resource-blocking) context;
+            # the page is always closed, even when navigation fails
+            pg = await (await _context()).new_page()
+            try:
+                await pg.goto(url_to_render, timeout=30000, wait_until="domcontentloaded")
+                return await pg.content()
+            finally:
+                await pg.close()
 
         async def fetch(url_to_fetch: str) -> str | None:
             async with sem:
@@ -310,31 +545,15 @@ async def crawl_website(url: str, max_pages: int = 300, concurrency: int = 8, re
                     return None
                 visited.add(url_to_fetch)
 
+                await _wait_turn()
                 start = perf_counter()
                 try:
                     if render_js:
                         # Playwright-rendered fetch with heavy resource blocking
-                        ctx = await browser.new_context()
-                        pg = await ctx.new_page()
-
-                        async def _route(route):
-                            if route.request.resource_type in ("image", "font", "stylesheet"):
-                                await route.abort()
-                            else:
-                                await route.continue_()
-
-                        try:
-                            await pg.route("**/*", _route)
-                        except Exception:
-                            pass
-
-                        await pg.goto(url_to_fetch, timeout=30000, wait_until="domcontentloaded")
-                        html = await pg.content()
+                        html = await render(url_to_fetch)
                         elapsed = perf_counter() - start
                         logger.info("Fetched (JS) %s in %.2fs", url_to_fetch, elapsed)
-                        soup = BeautifulSoup(html, "html.parser")
-                        text = soup.get_text(" ", strip=True)
-                        await ctx.close()
+                        text = _page_text(html)
                         return text[:6000]
                     else:
                         # Fast static fetch via aiohttp
@@ -343,33 +562,15 @@ async def crawl_website(url: str, max_pages: int = 300, concurrency: int = 8, re
                             if resp.status != 200:
                                 logger.debug("HTTP %s for %s", resp.status, url_to_fetch)
                                 return None
-                            html = await resp.text(errors="ignore")
+                            html = await _read_capped(resp)
                             elapsed = perf_counter() - start
                             logger.info("Fetched (static) %s in %.2fs", url_to_fetch, elapsed)
-                            soup = BeautifulSoup(html, "html.parser")
-                            text = soup.get_text(" ", strip=True)
+                            text = _page_text(html)
                             # Auto-switch to JS rendering if SPA indicators detected or very little text
                             if _looks_like_spa(html, len(text)):
                                 logger.info("Static fetch looked empty/SPA for %s; re-fetching with JS", url_to_fetch)
-                                ctx = await browser.new_context()
-                                pg = await ctx.new_page()
-
-                                async def _route(route):
-                                    if route.request.resource_type in ("image", "font", "stylesheet"):
-                                        await route.abort()
-                                    else:
-                                        await route.continue_()
-
-                                try:
-                                    await pg.route("**/*", _route)
-                                except Exception:
-                                    pass
-
-                                await pg.goto(url_to_fetch, timeout=30000, wait_until="domcontentloaded")
-                                html_js = await pg.content()
-                                soup_js = BeautifulSoup(html_js, "html.parser")
-                                text_js = soup_js.get_text(" ", strip=True)
-                                await ctx.close()
+                                html_js = await render(url_to_fetch)
+                                text_js = _page_text(html_js)
                                 return text_js[:6000]
                             return text[:6000]
                 except Exception as e:
@@ -379,22 +580,31 @@ async def crawl_website(url: str, max_pages: int = 300, concurrency: int = 8, re
 
         tasks = [fetch(l) for l in links_to_crawl]
         results = await asyncio.gather(*tasks)
-        for url_idx, r in enumerate(results):
+        # Context is capped at _MAX_CONTEXT_CHARS: a page goes in only if its whole
+        # "[URL] <url>" marker fits (ai_service splits the context back into pages on
+        # it), and only its text is trimmed; once full, no further pages are added
+        text_used = 0
+        context_full = False
+        # gather preserves order, so each result lines up with its link
+        for link, r in zip(links_to_crawl, results):
             if r:
-                collected_text.append(r)
-                # preserve the URL order mapping from links_to_crawl
-                try:
-                    crawled_urls.append(links_to_crawl[url_idx])
-                except Exception:
-                    pass
-
-        await browser.close()
-
-    # Close aiohttp session if used
-    try:
-        if 'aio_sess' in locals() and aio_sess:
-            await aio_sess.close()
-    except Exception:
-        pass
+                if not context_full:
+                    marker = f"[URL] {link}\n"
+                    remaining = _MAX_CONTEXT_CHARS - text_used - (1 if collected_text else 0) - len(marker)
+                    if remaining > 0:
+                        block = marker + r[:remaining]
+                        text_used += len(block) + (1 if collected_text else 0)
+                        collected_text.append(block)
+                    else:
+                        context_full = True
+                crawled_urls.append(link)
+        if len(collected_text) < len(crawled_urls):
+            logger.info(
+                "Context cap (%d chars) reached: page text kept for %d of %d crawled pages; the rest are listed by URL only",
+                _MAX_CONTEXT_CHARS, len(collected_text), len(crawled_urls)
+            )
+    finally:
+        if main_ctx is not None:
+            await main_ctx.close()
 
-    return "\n".join(collected_text)[:20000], crawled_urls
+    return "\n".join(collected_text), crawled_urls
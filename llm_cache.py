@@ -0,0 +1,122 @@
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+from time import monotonic
+
+import orjson
+
+
+def make_key(model: str, messages: list[dict], temperature: float | None = None, **extra) -> str:
+    """
+    Builds an exact-match cache key from everything that shapes the completion.
+    Any extra request options (tools, tool_choice, ...) are folded into the key.
+    """
+    payload = {"model": model, "messages": messages, "temperature": temperature, **extra}
+    return hashlib.sha256(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+def fingerprint(text: str) -> str:
+    """Stable digest of a (possibly very large) text, e.g. the website context."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Small in-process TTL + LRU cache for LLM responses.
+    Single-process Streamlit deployments share it across sessions.
+    """
+
+    def __init__(self, ttl: float = 3600, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: OrderedDict[str, tuple[float, object]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.stats["misses"] += 1
+                return None
+            self._data.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[1]
+
+    def set(self, key: str, value) -> None:
+        with self._lock:
+            self._data[key] = (monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class SemanticCache:
+    """
+    Embedding-similarity cache: returns a stored answer when a new question is
+    close enough (cosine similarity) to one already answered.
+    Entries are partitioned by a namespace (e.g. a website-context fingerprint)
+    so answers never leak across different sites. Like LLMCache, entries expire
+    after ttl and the least recently used namespaces are evicted beyond maxsize;
+    each namespace keeps at most max_per_namespace entries, which caps the scan.
+    """
+
+    def __init__(self, threshold: float = 0.92, ttl: float = 3600, maxsize: int = 1024, max_per_namespace: int = 256):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.max_per_namespace = max_per_namespace
+        self._data: OrderedDict[str, list[tuple[float, list[float], str]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def _normalize(vec: list[float]) -> list[float]:
+        norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+        return [v / norm for v in vec]
+
+    def get(self, namespace: str, embedding: list[float]) -> str | None:
+        query = self._normalize(embedding)
+        best_score, best_answer = -1.0, None
+        now = monotonic()
+        with self._lock:
+            entries = self._data.get(namespace)
+            if entries:
+                # Entries are appended in expiry order, so expired ones sit at the front
+                while entries and entries[0][0] < now:
+                    del entries[0]
+                if entries:
+                    self._data.move_to_end(namespace)
+                else:
+                    del self._data[namespace]
+            for _, vec, answer in entries or ():
+                score = sum(a * b for a, b in zip(query, vec))
+                if score > best_score:
+                    best_score, best_answer = score, answer
+            if best_answer is not None and best_score >= self.threshold:
+                self.stats["hits"] += 1
+                return best_answer
+            self.stats["misses"] += 1
+            return None
+
+    def add(self, namespace: str, embedding: list[float], answer: str) -> None:
+        vec = self._normalize(embedding)
+        with self._lock:
+            entries = self._data.setdefault(namespace, [])
+            entries.append((monotonic() + self.ttl, vec, answer))
+            if len(entries) > self.max_per_namespace:
+                del entries[0]
+            self._data.move_to_end(namespace)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
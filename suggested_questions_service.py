@@ -1,57 +1,70 @@
-import json
+import orjson
+import logging
+import random
+from functools import lru_cache
 from pathlib import Path
-from openai import OpenAI
-import os
-from dotenv import load_dotenv
-
-load_dotenv()  # Load .env variables
 
-# Azure OpenAI Configuration
-AZURE_OPENAI_KEY = os.getenv("AZURE_OPENAI_KEY")
-AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
-AZURE_OPENAI_DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
+# Reuse the shared chat helper (client pool, response cache, retries) from ai_service
+from ai_service import chat_completion, AZURE_OPENAI_FAST_DEPLOYMENT_NAME
 
-if not AZURE_OPENAI_KEY or not AZURE_OPENAI_ENDPOINT or not AZURE_OPENAI_DEPLOYMENT_NAME:
-    raise ValueError("Azure OpenAI credentials not found in .env. Required: AZURE_OPENAI_KEY, AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_DEPLOYMENT_NAME")
+# Basic logger for visibility in console/Streamlit logs
+logger = logging.getLogger("cmsautomatex.suggested_questions")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _formatter = logging.Formatter("%(asctime)s %(levelname)s [suggested_questions] %(message)s")
+    _handler.setFormatter(_formatter)
+    logger.addHandler(_handler)
+logger.setLevel(logging.INFO)
 
-# Create OpenAI client with Azure endpoint
-client = OpenAI(
-    base_url=AZURE_OPENAI_ENDPOINT,
-    api_key=AZURE_OPENAI_KEY
-)
 # ---------------- Static Questions Path ----------------
 STATIC_Q_PATH = Path("rfp_questions.json")
 
 #------ load static questions---------------------#
+@lru_cache(maxsize=1)
+def _read_static_questions(mtime_ns: int) -> tuple[dict, ...]:
+    # Keyed on the file's mtime so edits to the JSON are picked up without a restart
+    data = orjson.loads(STATIC_Q_PATH.read_bytes())
+    questions = data.get("static_questions", [])
+    if not isinstance(questions, list):
+        return ()
+    return tuple(questions)
+
+
 def load_static_questions() -> list[dict]:
     if not STATIC_Q_PATH.exists():
         return []
 
     try:
-        with open(STATIC_Q_PATH, "r", encoding="utf-8") as f:
-            data = json.load(f)
-
-        questions = data.get("static_questions", [])
-        if not isinstance(questions, list):
-            return []
+        questions = list(_read_static_questions(STATIC_Q_PATH.stat().st_mtime_ns))
 
         # Randomize order so callers don't always get the same ones
-        import random
         random.shuffle(questions)
 
         return questions
 
     except Exception as e:
-        print(f"Error loading static questions: {e}")
+        logger.warning("Error loading static questions: %s", e)
         return []
 
 
 
 #---------------------- AI QUESTIONS GENERATION ---------------------#
-def generate_ai_questions(context: str, limit: int = 2) -> list[dict]:
+def _parse_ai_questions(raw: str, limit: int) -> list[dict] | None:
+    # Exactly `limit` questions as a JSON array, or None if the reply is unusable
+    try:
+        data = orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        return None
+    if isinstance(data, list) and len(data) == limit:
+        return data
+    return None
+
+
+async def generate_ai_questions(context: str, limit: int = 2, model: str | None = None) -> list[dict]:
     """
     Generate contextual RFP discovery questions.
     These are ARCHITECT-led questions, not content extraction.
+    Uses the fast deployment unless a model is given.
     """
 
     prompt = f"""
@@ -89,9 +102,8 @@ Website Context (partial, for reference only):
 {context[:6000]}
 """
 
-    response = client.chat.completions.create(
-        model=AZURE_OPENAI_DEPLOYMENT_NAME,
-        messages=[
+    raw = await chat_completion(
+        [
             {
                 "role": "system",
                 "content": (
@@ -101,18 +113,18 @@ Website Context (partial, for reference only):
                 )
             },
             {"role": "user", "content": prompt}
-        ]
+        ],
+        model=model or AZURE_OPENAI_FAST_DEPLOYMENT_NAME,
+        # Only a reply that parses is cached, so the fallback below is never replayed
+        validate=lambda reply: _parse_ai_questions(reply, limit) is not None
     )
+    # Debug-level only: no per-call stdout I/O or formatting at INFO
+    logger.debug("RAW AI QUESTIONS: %s", raw)
 
-    raw = response.choices[0].message.content.strip()
-    print("RAW AI QUESTIONS:", raw)
-
-    try:
-        data = json.loads(raw)
-        if isinstance(data, list) and len(data) == limit:
-            return data
-    except Exception as e:
-        print("AI JSON PARSE FAILED:", e)
+    data = _parse_ai_questions(raw, limit)
+    if data is not None:
+        return data
+    logger.warning("AI questions reply was not a JSON array of %d items; using fallback", limit)
 
     # 🚨 Safety fallback (should rarely trigger now)
     return [
@@ -136,16 +148,14 @@ Website Context (partial, for reference only):
 
 
 #---------------------- COMBINED SUGGESTED QUESTIONS ---------------------#
-import random
-
-def get_suggested_questions(context: str) -> list[dict]:
+async def get_suggested_questions(context: str) -> list[dict]:
     static_all = load_static_questions()
     static_questions = random.sample(
         static_all,
         k=min(2, len(static_all))
     )
 
-    ai_questions = generate_ai_questions(
+    ai_questions = await generate_ai_questions(
         context=context,
         limit=2
     )
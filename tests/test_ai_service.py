@@ -0,0 +1,209 @@
+import asyncio
+import os
+from types import SimpleNamespace
+
+import orjson
+import pytest
+
+os.environ.setdefault("AZURE_OPENAI_KEY", "test-key")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://example.invalid/openai/v1/")
+os.environ.setdefault("AZURE_OPENAI_DEPLOYMENT_NAME", "test-deployment")
+
+import ai_service
+
+
+def _batch_result(urls, page_type="Article"):
+    return {
+        "overview": {"total_pages_analyzed": len(urls)},
+        "page_types": [{"name": page_type, "count": len(urls), "example_urls": list(urls)}],
+        "components": [],
+        "pages": [{"url": u, "page_type": page_type, "components": []} for u in urls],
+        "third_party_integrations": [],
+        "recommendations": [],
+    }
+
+
+def test_identical_pages_are_analyzed_once_and_fanned_out(monkeypatch):
+    calls = []
+
+    async def fake_batch(website_context, urls, url_count, batch_num=1, total_batches=1, slots=None):
+        calls.append({
+            "context": website_context,
+            "urls": list(urls),
+            "url_count": url_count,
+            "batch": (batch_num, total_batches),
+            "slots": slots,
+        })
+        return _batch_result(urls)
+
+    monkeypatch.setattr(ai_service, "_generate_rfp_batch", fake_batch)
+    ai_service.rfp_result_cache.clear()
+
+    context = "[URL] https://example.com/a\nSame body text\n[URL] https://example.com/b\nSame body text"
+    urls = ["https://example.com/a", "https://example.com/b"]
+    result = asyncio.run(ai_service.generate_rfp_analysis(context, urls))
+
+    assert len(calls) == 1
+    call = calls[0]
+    assert call["urls"] == ["https://example.com/a"]
+    assert call["url_count"] == 1
+    assert call["batch"] == (1, 1)
+    assert isinstance(call["slots"], asyncio.Semaphore)
+    assert "Same body text" in call["context"]
+    assert "https://example.com/b" not in call["context"]
+    assert [p["url"] for p in result["pages"]] == urls
+    assert result["page_types"][0]["count"] == 2
+    assert result["overview"]["total_pages_analyzed"] == 2
+
+
+def test_dedupe_identical_pages_groups_by_page_text():
+    sections = {
+        "a": "[URL] a\nShared text",
+        "b": "[URL] b",
+        "c": "[URL] c\nShared text\n",
+        "d": "[URL] d\nOther text",
+        "e": "[URL] e",
+    }
+    unique, duplicates = ai_service._dedupe_identical_pages(["a", "b", "c", "d", "e", "f"], sections)
+
+    # Pages without text (or without a section) are never grouped
+    assert unique == ["a", "b", "d", "e", "f"]
+    assert duplicates == {"a": ["c"]}
+
+
+def test_fan_out_duplicate_pages_updates_counts_and_totals():
+    data = {
+        "overview": {"total_pages_analyzed": 2},
+        "page_types": [
+            {"name": "Article", "count": 1},
+            {"name": "Home", "count": 1},
+        ],
+        "pages": [
+            {"url": "a", "page_type": "Article", "components": ["Hero"]},
+            {"url": "d", "page_type": "Home", "components": []},
+        ],
+    }
+    result = ai_service._fan_out_duplicate_pages(data, {"a": ["c", "e"]})
+
+    assert [p["url"] for p in result["pages"]] == ["a", "d", "c", "e"]
+    assert result["pages"][2] == {"url": "c", "page_type": "Article", "components": ["Hero"]}
+    assert {pt["name"]: pt["count"] for pt in result["page_types"]} == {"Article": 3, "Home": 1}
+    assert result["overview"]["total_pages_analyzed"] == 4
+
+
+def test_merge_rfp_batches_keeps_batch_order():
+    first = _batch_result(["a", "b"])
+    first["components"] = [{"name": "Hero", "found_on_urls": ["a"]}]
+    first["recommendations"] = ["Use templates", "Migrate media"]
+    second = _batch_result(["c"], page_type="Home")
+    second["page_types"].append({"name": "Article", "count": 2, "example_urls": ["d", "a"]})
+    second["components"] = [
+        {"name": "Footer", "found_on_urls": ["c"]},
+        {"name": "Hero", "found_on_urls": ["c", "a"]},
+    ]
+    second["recommendations"] = ["Migrate media", "Add search"]
+
+    merged = ai_service._merge_rfp_batches([first, second])
+
+    assert [p["url"] for p in merged["pages"]] == ["a", "b", "c"]
+    assert merged["overview"]["total_pages_analyzed"] == 3
+    assert [(pt["name"], pt["count"]) for pt in merged["page_types"]] == [("Article", 4), ("Home", 1)]
+    assert merged["page_types"][0]["example_urls"] == ["a", "b", "d"]
+    assert [(c["name"], c["found_on_urls"]) for c in merged["components"]] == [("Hero", ["a", "c"]), ("Footer", ["c"])]
+    assert merged["recommendations"] == ["Use templates", "Migrate media", "Add search"]
+    # The input batches are left untouched
+    assert first["components"][0]["found_on_urls"] == ["a"]
+
+
+def _tool_chunk(arguments, finish_reason):
+    call = SimpleNamespace(index=0, function=SimpleNamespace(arguments=arguments))
+    delta = SimpleNamespace(tool_calls=[call], content=None)
+    return SimpleNamespace(choices=[SimpleNamespace(finish_reason=finish_reason, delta=delta)])
+
+
+def test_truncated_batch_is_rerun_as_halves_within_the_concurrency_limit(monkeypatch):
+    limit = 2
+    requests = []
+    in_flight = 0
+    peak = 0
+
+    async def fake_stream(**kwargs):
+        nonlocal in_flight, peak
+        user_prompt = kwargs["messages"][1]["content"]
+        urls = [line[2:] for line in user_prompt.splitlines() if line.startswith("- https://")]
+        # The first request hits the token limit; everything after it succeeds
+        truncate = not requests
+        requests.append(urls)
+        in_flight += 1
+        peak = max(peak, in_flight)
+        try:
+            await asyncio.sleep(0.01)
+        finally:
+            in_flight -= 1
+        if truncate:
+            yield _tool_chunk('{"overview": {}, "pages": [{"url": "' + urls[0] + '"', "length")
+            return
+        yield _tool_chunk(orjson.dumps(_batch_result(urls)).decode(), "stop")
+
+    monkeypatch.setattr(ai_service, "_stream_completion", fake_stream)
+    monkeypatch.setattr(ai_service, "RFP_BATCH_CONCURRENCY", limit)
+    ai_service.llm_cache.clear()
+    ai_service.rfp_result_cache.clear()
+
+    # ~4000 chars per page packs 12 pages per 48k-char batch: 3 batches for 30 pages
+    urls = [f"https://example.com/p{i}" for i in range(30)]
+    context = "\n".join(f"[URL] {u}\n" + f"page {i} " * 600 for i, u in enumerate(urls))
+    result = asyncio.run(ai_service.generate_rfp_analysis(context, urls))
+
+    analyzed = [p["url"] for p in result["pages"]]
+    assert sorted(analyzed) == sorted(urls)
+    assert len(analyzed) == len(set(analyzed))
+    assert peak <= limit
+    # 3 batches, plus one request per half of the truncated batch
+    assert len(requests) == 5
+    truncated = requests[0]
+    halves = [r for r in requests[1:] if set(r) <= set(truncated)]
+    assert len(halves) == 2
+    assert sorted(halves[0] + halves[1]) == sorted(truncated)
+
+    # Only complete results are cached: a rerun of every batch is served from the cache
+    ai_service.rfp_result_cache.clear()
+    asyncio.run(ai_service.generate_rfp_analysis(context, urls))
+    assert len(requests) == 5
+
+
+@pytest.mark.parametrize("truncated, expected", [
+    # Cut inside a string value: the partial key/value pair is dropped
+    ('{"pages": [{"url": "a"}, {"url": "b", "page_type": "Art',
+     {"pages": [{"url": "a"}, {"url": "b"}]}),
+    # Cut inside a key
+    ('{"pages": [{"url": "a"}, {"url": "b", "page_ty',
+     {"pages": [{"url": "a"}, {"url": "b"}]}),
+    # Cut right after a trailing comma
+    ('{"pages": [{"url": "a"}, {"url": "b"},',
+     {"pages": [{"url": "a"}, {"url": "b"}]}),
+    # Cut inside nested arrays: complete inner arrays are kept, every level is closed
+    ('{"pages": [{"url": "a", "components": ["Hero", ["x", "y"], "Fo',
+     {"pages": [{"url": "a", "components": ["Hero", ["x", "y"]]}]}),
+    # Commas and escaped quotes inside strings are not structural
+    ('{"pages": [{"url": "a, b"}, {"url": "c\\", d',
+     {"pages": [{"url": "a, b"}]}),
+])
+def test_close_truncated_json_repairs_cut_off_output(truncated, expected):
+    assert orjson.loads(ai_service._close_truncated_json(truncated)) == expected
+
+
+def test_close_truncated_json_edge_cases():
+    # Already balanced input is returned unchanged
+    assert ai_service._close_truncated_json('{"a": [1, 2]}') == '{"a": [1, 2]}'
+    # Nothing complete to keep before the cut
+    assert ai_service._close_truncated_json('{"a": "b') is None
+
+
+def test_estimate_rfp_seconds_counts_waves(monkeypatch):
+    monkeypatch.setattr(ai_service, "RFP_BATCH_CONCURRENCY", 2)
+    low, high = ai_service.RFP_SECONDS_PER_WAVE
+
+    assert ai_service.estimate_rfp_seconds(0, 0) == (low, high)
+    # 5 budget-sized batches run 2 at a time: 3 waves
+    assert ai_service.estimate_rfp_seconds(30, 5 * ai_service.RFP_CONTEXT_CHAR_BUDGET) == (3 * low, 3 * high)